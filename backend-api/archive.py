@@ -0,0 +1,301 @@
+import gzip
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+import bson
+from bson import Binary, ObjectId
+from decouple import config
+from pymongo.errors import BulkWriteError
+
+from database import mongodb, Collections
+
+try:
+    import zstandard
+except ImportError:  # optional, archives fall back to gzip
+    zstandard = None
+
+Position = Tuple[datetime, ObjectId]
+
+
+def _position(message: Dict[str, Any]) -> Position:
+    return (message["created_at"], message["_id"])
+
+
+class MessageArchive:
+    """Cold storage for old messages.
+
+    Messages older than ARCHIVE_AFTER_DAYS are moved out of the messages
+    collection into compressed segments in message_archives: one document
+    per chat and calendar month holding up to ARCHIVE_SEGMENT_MAX_MESSAGES
+    BSON-encoded messages. Each segment records its (created_at, _id) range
+    so history reads can pick the segments a cursor crosses into.
+    """
+
+    def __init__(self):
+        self.after_days = config("ARCHIVE_AFTER_DAYS", 180, cast=int)
+        self.segment_max_messages = config(
+            "ARCHIVE_SEGMENT_MAX_MESSAGES", 2000, cast=int
+        )
+        self.codec = "zstd" if zstandard is not None else "gzip"
+        self.zstd_level = config("ARCHIVE_ZSTD_LEVEL", 10, cast=int)
+
+    # Encoding
+
+    def compress(self, raw: bytes) -> bytes:
+        if self.codec == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(raw)
+        return gzip.compress(raw, compresslevel=9)
+
+    @staticmethod
+    def decompress(codec: str, data: bytes) -> bytes:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd archives")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def encode_segment(self, chat_id: str, messages: List[Dict[str, Any]]):
+        """Segment document for messages sorted by (created_at, _id)"""
+        raw = bson.encode({"messages": messages})
+        data = self.compress(raw)
+        seqs = [message["seq"] for message in messages if "seq" in message]
+        return {
+            "chat_id": chat_id,
+            "first_at": messages[0]["created_at"],
+            "first_id": messages[0]["_id"],
+            "last_at": messages[-1]["created_at"],
+            "last_id": messages[-1]["_id"],
+            "count": len(messages),
+            "min_seq": min(seqs) if seqs else None,
+            "max_seq": max(seqs) if seqs else None,
+            "codec": self.codec,
+            "raw_bytes": len(raw),
+            "stored_bytes": len(data),
+            "sha256": hashlib.sha256(raw).hexdigest(),
+            "data": Binary(data),
+            "archived_at": datetime.now(),
+        }
+
+    def decode_segment(self, segment: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Messages of a segment; raises ValueError if it is corrupt"""
+        raw = self.decompress(segment["codec"], segment["data"])
+        if hashlib.sha256(raw).hexdigest() != segment["sha256"]:
+            raise ValueError(f"Archive segment {segment['_id']} checksum mismatch")
+        messages = bson.decode(raw)["messages"]
+        if len(messages) != segment["count"]:
+            raise ValueError(f"Archive segment {segment['_id']} count mismatch")
+        return messages
+
+    # Archiving
+
+    async def archive_chat(self, chat_id: str, cutoff: datetime) -> Dict[str, int]:
+        """Move a chat's messages older than cutoff into segments.
+
+        Segments are written before the live copies are deleted, so an
+        interrupted run leaves duplicates (ignored by reads, reported by
+        verify) rather than losing messages.
+        """
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        archives_collection = mongodb.get_collection(Collections.MESSAGE_ARCHIVES)
+
+        # Messages still waiting to be published stay live
+        cursor = (
+            messages_collection.find(
+                {
+                    "chat_id": chat_id,
+                    "created_at": {"$lt": cutoff},
+                    "outbox": {"$exists": False},
+                }
+            )
+            .sort([("created_at", 1), ("_id", 1)])
+            .batch_size(self.segment_max_messages)
+        )
+
+        totals = {"segments": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+        async def flush(batch):
+            segment = self.encode_segment(chat_id, batch)
+            await archives_collection.insert_one(segment)
+            await messages_collection.delete_many(
+                {"_id": {"$in": [message["_id"] for message in batch]}}
+            )
+            totals["segments"] += 1
+            totals["messages"] += len(batch)
+            totals["raw_bytes"] += segment["raw_bytes"]
+            totals["stored_bytes"] += segment["stored_bytes"]
+
+        batch: List[Dict[str, Any]] = []
+        batch_month = None
+        async for message in cursor:
+            month = (message["created_at"].year, message["created_at"].month)
+            if batch and (
+                len(batch) >= self.segment_max_messages or month != batch_month
+            ):
+                await flush(batch)
+                batch = []
+            batch.append(message)
+            batch_month = month
+        if batch:
+            await flush(batch)
+        return totals
+
+    async def chats_with_messages_before(self, cutoff: datetime) -> List[str]:
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        return await messages_collection.distinct(
+            "chat_id", {"created_at": {"$lt": cutoff}}
+        )
+
+    # Reading
+
+    async def read(
+        self,
+        chat_id: str,
+        position: Optional[Position],
+        direction: int,
+        count: int,
+    ) -> List[Dict[str, Any]]:
+        """Up to count archived messages strictly past position, nearest
+        first; direction -1 walks back in time, 1 forward. Without a
+        position it starts from the newest (or oldest) archived message."""
+        archives_collection = mongodb.get_collection(Collections.MESSAGE_ARCHIVES)
+        query: Dict[str, Any] = {"chat_id": chat_id}
+        if direction < 0:
+            if position:
+                query["first_at"] = {"$lte": position[0]}
+            sort = [("last_at", -1), ("last_id", -1)]
+        else:
+            if position:
+                query["last_at"] = {"$gte": position[0]}
+            sort = [("first_at", 1), ("first_id", 1)]
+
+        found: Dict[ObjectId, Dict[str, Any]] = {}
+        ordered: List[Dict[str, Any]] = []
+        async for segment in archives_collection.find(query).sort(sort):
+            # Segments can overlap, so stop only once this one starts beyond
+            # the count-th nearest message found so far
+            if len(ordered) >= count:
+                boundary = _position(ordered[count - 1])
+                if direction < 0:
+                    edge = (segment["last_at"], segment["last_id"])
+                    if edge < boundary:
+                        break
+                else:
+                    edge = (segment["first_at"], segment["first_id"])
+                    if edge > boundary:
+                        break
+
+            for message in self.decode_segment(segment):
+                key = _position(message)
+                if position is None or (
+                    key < position if direction < 0 else key > position
+                ):
+                    found[message["_id"]] = message
+            ordered = sorted(found.values(), key=_position, reverse=direction < 0)
+
+        return ordered[:count]
+
+    async def newest_position(self, chat_id: str) -> Optional[Position]:
+        """(created_at, _id) of the chat's newest archived message, if any"""
+        archives_collection = mongodb.get_collection(Collections.MESSAGE_ARCHIVES)
+        segment = await archives_collection.find_one(
+            {"chat_id": chat_id},
+            {"last_at": 1, "last_id": 1},
+            sort=[("last_at", -1), ("last_id", -1)],
+        )
+        if segment is None:
+            return None
+        return (segment["last_at"], segment["last_id"])
+
+    # Maintenance
+
+    async def restore(
+        self, chat_id: Optional[str] = None, since: Optional[datetime] = None
+    ) -> Dict[str, int]:
+        """Move archived messages back into the messages collection"""
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        archives_collection = mongodb.get_collection(Collections.MESSAGE_ARCHIVES)
+        query: Dict[str, Any] = {}
+        if chat_id:
+            query["chat_id"] = chat_id
+        if since:
+            query["last_at"] = {"$gte": since}
+
+        totals = {"segments": 0, "messages": 0}
+        async for segment in archives_collection.find(query):
+            messages = self.decode_segment(segment)
+            try:
+                await messages_collection.insert_many(messages, ordered=False)
+            except BulkWriteError as e:
+                # Copies left live by an interrupted archive run
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+            await archives_collection.delete_one({"_id": segment["_id"]})
+            totals["segments"] += 1
+            totals["messages"] += len(messages)
+        return totals
+
+    async def verify(self, repair: bool = False) -> Dict[str, Any]:
+        """Decode every segment and look for messages that are also live.
+
+        With repair, live copies of archived messages are deleted.
+        """
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        archives_collection = mongodb.get_collection(Collections.MESSAGE_ARCHIVES)
+
+        report = {"segments": 0, "messages": 0, "corrupt": [], "still_live": 0}
+        async for segment in archives_collection.find({}):
+            report["segments"] += 1
+            try:
+                messages = self.decode_segment(segment)
+            except Exception as e:
+                report["corrupt"].append(f"{segment['_id']}: {e}")
+                continue
+            report["messages"] += len(messages)
+
+            ids = [message["_id"] for message in messages]
+            live = await messages_collection.count_documents({"_id": {"$in": ids}})
+            report["still_live"] += live
+            if live and repair:
+                await messages_collection.delete_many({"_id": {"$in": ids}})
+        return report
+
+    async def storage_report(self) -> Dict[str, Any]:
+        database = mongodb.database
+        live = await database.command("collStats", Collections.MESSAGES)
+        totals = await (
+            mongodb.get_collection(Collections.MESSAGE_ARCHIVES)
+            .aggregate(
+                [
+                    {
+                        "$group": {
+                            "_id": None,
+                            "segments": {"$sum": 1},
+                            "messages": {"$sum": "$count"},
+                            "raw_bytes": {"$sum": "$raw_bytes"},
+                            "stored_bytes": {"$sum": "$stored_bytes"},
+                        }
+                    }
+                ]
+            )
+            .to_list(1)
+        )
+        archived = totals[0] if totals else {}
+        archived.pop("_id", None)
+        raw = archived.get("raw_bytes", 0)
+        stored = archived.get("stored_bytes", 0)
+        return {
+            "live": {
+                "messages": live.get("count", 0),
+                "data_bytes": live.get("size", 0),
+                "storage_bytes": live.get("storageSize", 0),
+                "index_bytes": live.get("totalIndexSize", 0),
+            },
+            "archived": archived,
+            "compression_ratio": round(raw / stored, 2) if stored else None,
+            "bytes_saved": raw - stored,
+        }
+
+
+# Create message archive instance
+message_archive = MessageArchive()
@@ -0,0 +1,150 @@
+# archive_messages.py
+"""Move old messages to compressed cold storage and manage the archive.
+
+    python archive_messages.py archive [--older-than DAYS] [--chat ID]
+    python archive_messages.py restore [--chat ID] [--since YYYY-MM-DD]
+    python archive_messages.py verify [--repair]
+    python archive_messages.py report
+
+archive moves messages older than --older-than days (ARCHIVE_AFTER_DAYS by
+default) into per-chat monthly segments; history reads keep returning them.
+restore moves segments back, verify decodes every segment and finds
+messages left live by an interrupted run (deleted with --repair), and
+report compares live and archived storage.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from archive import message_archive
+from database import mongodb
+
+
+def _mb(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f} MB"
+
+
+async def archive(older_than: int, chat_ids):
+    cutoff = datetime.now() - timedelta(days=older_than)
+    if not chat_ids:
+        chat_ids = await message_archive.chats_with_messages_before(cutoff)
+    print(f"Archiving messages before {cutoff:%Y-%m-%d} in {len(chat_ids)} chats")
+
+    totals = {"segments": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+    for chat_id in chat_ids:
+        result = await message_archive.archive_chat(chat_id, cutoff)
+        if result["messages"]:
+            print(
+                f"✓ {chat_id}: {result['messages']} messages in "
+                f"{result['segments']} segments"
+            )
+        for key, value in result.items():
+            totals[key] += value
+
+    stored = totals["stored_bytes"]
+    ratio = totals["raw_bytes"] / stored if stored else 0
+    print(
+        f"Archived {totals['messages']} messages into {totals['segments']} "
+        f"segments: {_mb(totals['raw_bytes'])} -> {_mb(totals['stored_bytes'])} "
+        f"({ratio:.1f}x)"
+    )
+
+
+async def restore(chat_id, since):
+    result = await message_archive.restore(chat_id, since)
+    print(
+        f"✓ Restored {result['messages']} messages from "
+        f"{result['segments']} segments"
+    )
+
+
+async def verify(repair: bool):
+    report = await message_archive.verify(repair)
+    print(f"Checked {report['segments']} segments, {report['messages']} messages")
+    for problem in report["corrupt"]:
+        print(f"✗ {problem}")
+    if report["still_live"]:
+        action = "deleted" if repair else "run with --repair to delete them"
+        print(f"! {report['still_live']} archived messages are also live ({action})")
+    if not report["corrupt"] and not report["still_live"]:
+        print("✓ Archive is consistent")
+    return not report["corrupt"]
+
+
+async def report():
+    result = await message_archive.storage_report()
+    live = result["live"]
+    archived = result["archived"]
+    print(
+        f"Live:     {live['messages']} messages, {_mb(live['data_bytes'])} data, "
+        f"{_mb(live['storage_bytes'])} on disk, {_mb(live['index_bytes'])} indexes"
+    )
+    if archived:
+        print(
+            f"Archived: {archived['messages']} messages in "
+            f"{archived['segments']} segments, {_mb(archived['raw_bytes'])} "
+            f"-> {_mb(archived['stored_bytes'])} "
+            f"({result['compression_ratio']}x, {_mb(result['bytes_saved'])} saved)"
+        )
+    else:
+        print("Archived: nothing yet")
+    print(json.dumps(result, indent=2, default=str))
+
+
+async def main(args):
+    await mongodb.connect()
+    ok = True
+    try:
+        if args.command == "archive":
+            await archive(args.older_than, args.chat)
+        elif args.command == "restore":
+            since = datetime.fromisoformat(args.since) if args.since else None
+            await restore(args.chat, since)
+        elif args.command == "verify":
+            ok = await verify(args.repair)
+        else:
+            await report()
+    finally:
+        await mongodb.close()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive_parser = commands.add_parser("archive", help="archive old messages")
+    archive_parser.add_argument(
+        "--older-than",
+        type=int,
+        default=message_archive.after_days,
+        metavar="DAYS",
+        help="archive messages older than this many days",
+    )
+    archive_parser.add_argument(
+        "--chat", action="append", default=[], help="only this chat (repeatable)"
+    )
+
+    restore_parser = commands.add_parser("restore", help="move segments back")
+    restore_parser.add_argument("--chat", help="only this chat")
+    restore_parser.add_argument(
+        "--since", help="only segments with messages on or after this date"
+    )
+
+    verify_parser = commands.add_parser("verify", help="check every segment")
+    verify_parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="delete live copies of archived messages",
+    )
+
+    commands.add_parser("report", help="storage used by live and archived messages")
+
+    asyncio.run(main(parser.parse_args()))
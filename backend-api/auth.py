@@ -1,10 +1,16 @@
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+import uuid
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from database import mongodb, Collections
-from models import UserResponse, UserCreate
+from sessions import session_store
+from utils import TTLCache
+from models import UserResponse, UserCreate, UserRole
 from bson import ObjectId
 import os
 from decouple import config
@@ -14,9 +20,98 @@ SECRET_KEY = config("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Changing BCRYPT_ROUNDS makes existing hashes get upgraded on next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=config("BCRYPT_ROUNDS", 12, cast=int),
+)
 security = HTTPBearer()
 
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated thread pool so it never blocks the event loop.
+
+    PASSWORD_HASH_WORKERS caps how many hashes run at once; further calls
+    wait in the pool's queue, and the time they spend there is recorded.
+    """
+
+    def __init__(self):
+        self.max_workers = config("PASSWORD_HASH_WORKERS", 4, cast=int)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="bcrypt"
+        )
+        self.pending = 0
+        self.completed = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.run_time_total = 0.0
+
+    async def run(self, func, *args):
+        submitted = time.monotonic()
+
+        def timed():
+            started = time.monotonic()
+            try:
+                return func(*args)
+            finally:
+                self._record(started - submitted, time.monotonic() - started)
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, timed)
+        finally:
+            self.pending -= 1
+
+    def _record(self, queue_time: float, run_time: float):
+        self.completed += 1
+        self.queue_time_total += queue_time
+        self.queue_time_max = max(self.queue_time_max, queue_time)
+        self.run_time_total += run_time
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        completed = self.completed
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "completed": completed,
+            "avg_queue_ms": (
+                round(self.queue_time_total / completed * 1000, 2) if completed else 0.0
+            ),
+            "max_queue_ms": round(self.queue_time_max * 1000, 2),
+            "avg_run_ms": (
+                round(self.run_time_total / completed * 1000, 2) if completed else 0.0
+            ),
+        }
+
+
+password_hasher = PasswordHasher()
+
+
+# Resolved users by ID, and decoded JWT payloads by token string
+user_cache = TTLCache(
+    max_size=config("USER_CACHE_SIZE", 10000, cast=int),
+    ttl=config("USER_CACHE_TTL", 60, cast=float),
+)
+token_cache = TTLCache(
+    max_size=config("TOKEN_CACHE_SIZE", 10000, cast=int),
+    ttl=config("TOKEN_CACHE_TTL", 300, cast=float),
+)
+
+
+def invalidate_user(user_id: str):
+    """Drop a cached user; call after changing their profile or role"""
+    user_cache.pop(user_id)
+
+
+def invalidate_all_users():
+    user_cache.clear()
+
+
 class AuthHandler:
     @staticmethod
     def get_password_hash(password):
@@ -25,6 +120,18 @@ class AuthHandler:
     @staticmethod
     def verify_password(plain_password, hashed_password):
         return pwd_context.verify(plain_password, hashed_password)
+
+    @staticmethod
+    async def hash_password_async(password):
+        return await password_hasher.run(pwd_context.hash, password)
+
+    @staticmethod
+    async def verify_and_update_password(plain_password, hashed_password):
+        """Verify off the event loop; also returns a new hash when the stored
+        one uses outdated settings (e.g. a lower bcrypt cost), else None."""
+        return await password_hasher.run(
+            pwd_context.verify_and_update, plain_password, hashed_password
+        )
     
     @staticmethod
     def create_access_token(data: dict):
@@ -33,19 +140,53 @@ class AuthHandler:
         to_encode.update({"exp": expire})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
+
+    @staticmethod
+    async def create_session_token(user_id: str, user_agent: str = None):
+        """Start a new session for the user and return its access token"""
+        session_id = uuid.uuid4().hex
+        expires_at = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        await session_store.create(session_id, user_id, expires_at, user_agent)
+        return AuthHandler.create_access_token(
+            data={"sub": user_id, "jti": session_id}
+        )
     
+    @staticmethod
+    def decode_token(token: str) -> dict:
+        """Decode a JWT, memoizing the payload until the token expires"""
+        payload = token_cache.get(token)
+        if payload is not None:
+            return payload
+
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        exp = payload.get("exp")
+        ttl = exp - time.time() if exp else None
+        if ttl is None or ttl > 0:
+            token_cache.set(token, payload, ttl)
+        return payload
+
     @staticmethod
     async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         token = credentials.credentials
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            payload = AuthHandler.decode_token(token)
             user_id = payload.get("sub")
             if user_id is None:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Invalid authentication credentials"
                 )
-            
+
+            if session_store.is_revoked(payload.get("jti")):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Session has been revoked"
+                )
+
+            cached_user = user_cache.get(user_id)
+            if cached_user is not None:
+                return cached_user
+
             users_collection = mongodb.get_collection(Collections.USERS)
             user = await users_collection.find_one({"_id": ObjectId(user_id)})
             if user is None:
@@ -54,7 +195,7 @@ class AuthHandler:
                     detail="User not found"
                 )
             
-            return UserResponse(
+            user_response = UserResponse(
                 id=str(user["_id"]),
                 username=user["username"],
                 email=user["email"],
@@ -62,6 +203,8 @@ class AuthHandler:
                 role=user["role"],
                 created_at=user["created_at"]
             )
+            user_cache.set(user_id, user_response)
+            return user_response
         except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -70,4 +213,24 @@ class AuthHandler:
 
 # Dependency to get current user
 async def get_current_user(user: UserResponse = Depends(AuthHandler.verify_token)):
-    return user
\ No newline at end of file
+    return user
+
+
+def get_session_id(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Session ID (jti) of the bearer token; None for tokens issued before sessions"""
+    try:
+        return AuthHandler.decode_token(credentials.credentials).get("jti")
+    except JWTError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
+
+
+async def get_admin_user(user: UserResponse = Depends(get_current_user)):
+    if user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return user
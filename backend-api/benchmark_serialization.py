@@ -0,0 +1,98 @@
+# benchmark_serialization.py
+"""Per-message cost of encoding a history page, before and after the fast path.
+
+legacy  serialize_doc -> MessageResponse -> response_model validation ->
+        jsonable_encoder -> json.dumps (what FastAPI did per request)
+fast    message_view -> orjson in one pass (MongoJSONResponse)
+cached  joining pre-encoded messages from the recent-message cache
+
+    python benchmark_serialization.py [--messages 50] [--rounds 2000]
+"""
+import argparse
+import json
+import sys
+import os
+import timeit
+from datetime import datetime, timedelta
+from typing import List
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from encoders import dumps, message_view
+from models import MessageResponse
+from utils import serialize_doc
+
+
+def make_messages(count: int) -> List[dict]:
+    now = datetime.now()
+    chat_id = str(ObjectId())
+    sender_id = str(ObjectId())
+    return [
+        {
+            "_id": ObjectId(),
+            "chat_id": chat_id,
+            "content": f"Message number {i} with a few words of text",
+            "sender_id": sender_id,
+            "sender_username": "john_doe",
+            "message_type": "text",
+            "created_at": now - timedelta(seconds=count - i),
+            "reply_to": None,
+            "seq": i + 1,
+        }
+        for i in range(count)
+    ]
+
+
+adapter = TypeAdapter(List[MessageResponse])
+
+
+def legacy(docs: List[dict]) -> bytes:
+    # serialize_doc works in place, so each round starts from fresh copies
+    responses = [MessageResponse(**serialize_doc(dict(doc))) for doc in docs]
+    validated = adapter.validate_python([r.model_dump() for r in responses])
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+def fast(docs: List[dict]) -> bytes:
+    return dumps([message_view(doc) for doc in docs])
+
+
+def cached(encoded: List[bytes]) -> bytes:
+    return b"[" + b",".join(encoded) + b"]"
+
+
+def main(count: int, rounds: int):
+    docs = make_messages(count)
+    encoded = [dumps(message_view(doc)) for doc in docs]
+
+    assert json.loads(legacy(docs)) == json.loads(fast(docs)) == json.loads(
+        cached(encoded)
+    ), "encodings differ"
+
+    print(f"{count} messages per page, {rounds} rounds")
+    baseline = None
+    for name, func, arg in (
+        ("legacy", legacy, docs),
+        ("fast", fast, docs),
+        ("cached", cached, encoded),
+    ):
+        seconds = min(timeit.repeat(lambda: func(arg), number=rounds, repeat=3))
+        per_message = seconds / rounds / count * 1e6
+        baseline = baseline or per_message
+        print(
+            f"{name:>7}: {per_message:7.2f} µs/message "
+            f"({baseline / per_message:5.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.messages, args.rounds)
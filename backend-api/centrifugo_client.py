@@ -1,8 +1,10 @@
 import aiohttp
+import asyncio
 import jwt
 import time
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import os
 from decouple import config
 import json
@@ -13,6 +15,214 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class CircuitOpenError(Exception):
+    """Raised instead of calling Centrifugo while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Stops calling Centrifugo after repeated failures.
+
+    After CENTRIFUGO_BREAKER_THRESHOLD consecutive failures the circuit opens
+    and calls fail fast. Once CENTRIFUGO_BREAKER_RECOVERY seconds pass, a
+    limited number of probe calls are let through (half-open); a successful
+    probe closes the circuit, a failed one opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self):
+        self.failure_threshold = config("CENTRIFUGO_BREAKER_THRESHOLD", 5, cast=int)
+        self.recovery_timeout = config("CENTRIFUGO_BREAKER_RECOVERY", 10.0, cast=float)
+        self.half_open_max_calls = config("CENTRIFUGO_BREAKER_PROBES", 1, cast=int)
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def accepting(self) -> bool:
+        """False while open and not yet due for a probe"""
+        return not (
+            self.state == self.OPEN
+            and time.monotonic() - self.opened_at < self.recovery_timeout
+        )
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self.half_open_calls = 0
+            logger.info("Centrifugo circuit half-open, probing")
+
+        if self.state == self.HALF_OPEN:
+            if self.half_open_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                return False
+            self.half_open_calls += 1
+
+        return True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Centrifugo circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.error(
+                    f"Centrifugo circuit opened after {self.failures} failures"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = 0.0
+        if self.state == self.OPEN:
+            elapsed = time.monotonic() - self.opened_at
+            retry_in = max(0.0, round(self.recovery_timeout - elapsed, 2))
+
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_in": retry_in,
+        }
+
+
+class PublishBatcher:
+    """Collects publications for a short window and sends them as one batch"""
+
+    def __init__(self, client: "CentrifugoClient"):
+        self.client = client
+        self.window = config("CENTRIFUGO_BATCH_WINDOW_MS", 3, cast=float) / 1000
+        self.max_batch_size = config("CENTRIFUGO_BATCH_MAX_SIZE", 100, cast=int)
+        self.max_queue_size = config("CENTRIFUGO_BATCH_MAX_QUEUE", 10000, cast=int)
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+        self.batches_sent = 0
+        self.items_sent = 0
+        self.items_failed = 0
+        self.items_shed = 0
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued and stop the worker task"""
+        if not self.task:
+            return
+        if not self.task.done():
+            # Sentinel tells the worker to send what it has and exit
+            await self.queue.put(None)
+            await self.task
+        self.task = None
+
+        leftover = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                leftover.append(item)
+        if leftover:
+            await self._send(leftover)
+
+    async def submit(self, channel: str, data: Dict[str, Any]) -> asyncio.Future:
+        """Queue a publication and return a future resolving to its success.
+
+        Waits for free space when the queue is full so producers slow down
+        instead of growing memory without bound.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if not self.client.breaker.accepting:
+            # Degraded mode: shed instead of queueing behind an outage
+            self.items_shed += 1
+            future.set_result(False)
+            return future
+
+        if self.task is None or self.task.done():
+            # Batcher not running (e.g. scripts) - publish directly
+            future.set_result(await self.client.publish(channel, data))
+            return future
+
+        await self.queue.put((channel, data, future))
+        return future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.window
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._send(batch)
+
+    async def _send(self, batch: List[Tuple[str, Dict[str, Any], asyncio.Future]]):
+        publications = [(channel, data) for channel, data, _ in batch]
+        try:
+            results = await self.client.publish_batch(publications)
+        except Exception as e:
+            logger.error(f"Unexpected error sending Centrifugo batch: {e}")
+            results = [False] * len(batch)
+
+        self.batches_sent += 1
+        self.items_sent += len(batch)
+        self.items_failed += results.count(False)
+
+        for (_, _, future), success in zip(batch, results):
+            if not future.done():
+                future.set_result(success)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": bool(self.task and not self.task.done()),
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "max_queue_size": self.max_queue_size,
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "batches_sent": self.batches_sent,
+            "items_sent": self.items_sent,
+            "items_failed": self.items_failed,
+            "items_shed": self.items_shed,
+            "avg_batch_size": (
+                round(self.items_sent / self.batches_sent, 2)
+                if self.batches_sent
+                else 0
+            ),
+        }
+
+
 class CentrifugoClient:
     def __init__(self):
         self.api_url = config("CENTRIFUGO_API_URL", "http://localhost:9001").rstrip("/")
@@ -20,12 +230,124 @@ class CentrifugoClient:
         self.secret = config("CENTRIFUGO_SECRET", "your-secret-here")
         self.timeout = aiohttp.ClientTimeout(total=10)
 
+        # Per-method timeouts, much tighter than the session-wide limit
+        self.method_timeouts = {
+            "publish": config("CENTRIFUGO_PUBLISH_TIMEOUT", 2.0, cast=float),
+            "broadcast": config("CENTRIFUGO_BROADCAST_TIMEOUT", 3.0, cast=float),
+            "batch": config("CENTRIFUGO_BATCH_TIMEOUT", 3.0, cast=float),
+            "presence": config("CENTRIFUGO_PRESENCE_TIMEOUT", 1.0, cast=float),
+        }
+        self.breaker = CircuitBreaker()
+
+        # Connection pool settings for the shared HTTP session
+        self.pool_limit = config("CENTRIFUGO_POOL_LIMIT", 100, cast=int)
+        self.pool_limit_per_host = config("CENTRIFUGO_POOL_LIMIT_PER_HOST", 0, cast=int)
+        self.keepalive_timeout = config("CENTRIFUGO_KEEPALIVE_TIMEOUT", 30, cast=float)
+        self.dns_cache_ttl = config("CENTRIFUGO_DNS_CACHE_TTL", 300, cast=int)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.connector: Optional[aiohttp.TCPConnector] = None
+        self.batcher = PublishBatcher(self)
+
         # Validate configuration
         if not self.api_key or self.api_key == "your-api-key-here":
             logger.warning("Centrifugo API key not configured properly")
         if not self.secret or self.secret == "your-secret-here":
             logger.warning("Centrifugo secret not configured properly")
 
+    async def start(self):
+        """Create the long-lived HTTP session used for all API calls"""
+        if self.session and not self.session.closed:
+            return
+
+        self.connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.pool_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            use_dns_cache=True,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=self.connector,
+            timeout=self.timeout,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"apikey {self.api_key}",
+            },
+        )
+        logger.info(
+            f"Centrifugo HTTP session started (limit={self.pool_limit}, "
+            f"limit_per_host={self.pool_limit_per_host})"
+        )
+        self.batcher.start()
+
+    async def close(self):
+        """Close the shared HTTP session and its connection pool"""
+        await self.batcher.stop()
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self.connector = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating it lazily if needed"""
+        if self.session is None or self.session.closed:
+            await self.start()
+        return self.session
+
+    @asynccontextmanager
+    async def _post(self, payload: Dict[str, Any]):
+        """POST an API command through the circuit breaker"""
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("Centrifugo circuit is open")
+
+        method = payload["method"]
+        timeout = aiohttp.ClientTimeout(
+            total=self.method_timeouts.get(method, self.timeout.total)
+        )
+        recorded = False
+        try:
+            session = await self.get_session()
+            async with session.post(
+                f"{self.api_url}/api", json=payload, timeout=timeout
+            ) as response:
+                recorded = True
+                if response.status >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                yield response
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Always settle the call, cancellation included, so a half-open
+            # probe is never left hanging
+            if not recorded:
+                self.breaker.record_failure()
+            raise
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for sizing the connector"""
+        connector = self.connector
+        if connector is None or connector.closed:
+            return {"active": False, "limit": self.pool_limit}
+
+        # aiohttp does not expose these publicly, so read them defensively
+        acquired = len(getattr(connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+        waiters = sum(len(w) for w in getattr(connector, "_waiters", {}).values())
+
+        return {
+            "active": True,
+            "limit": connector.limit,
+            "limit_per_host": connector.limit_per_host,
+            "acquired": acquired,
+            "idle": idle,
+            "waiting": waiters,
+            "keepalive_timeout": self.keepalive_timeout,
+            "dns_cache_ttl": self.dns_cache_ttl,
+        }
+
     def generate_token(self, user_id: str, expires_in: int = 3600) -> str:
         """Generate JWT token for Centrifugo connection"""
         try:
@@ -41,37 +363,31 @@ class CentrifugoClient:
         """Publish message to Centrifugo channel"""
         payload = {"method": "publish", "params": {"channel": channel, "data": data}}
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"apikey {self.api_key}",
-        }
-
         try:
             logger.info(f"Publishing to channel: {channel}, data: {data}")
 
-            async with aiohttp.ClientSession(timeout=self.timeout) as session:
-                async with session.post(
-                    f"{self.api_url}/api", json=payload, headers=headers
-                ) as response:
+            async with self._post(payload) as response:
+                response_text = await response.text()
+                logger.info(
+                    f"Centrifugo response status: {response.status}, body: {response_text}"
+                )
 
-                    response_text = await response.text()
-                    logger.info(
-                        f"Centrifugo response status: {response.status}, body: {response_text}"
-                    )
-
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get("error"):
-                            logger.error(f"Centrifugo publish error: {result['error']}")
-                            return False
-                        logger.info("Message published successfully to Centrifugo")
-                        return True
-                    else:
-                        logger.error(
-                            f"Centrifugo HTTP error: {response.status}, response: {response_text}"
-                        )
+                if response.status == 200:
+                    result = await response.json()
+                    if result.get("error"):
+                        logger.error(f"Centrifugo publish error: {result['error']}")
                         return False
+                    logger.info("Message published successfully to Centrifugo")
+                    return True
+                else:
+                    logger.error(
+                        f"Centrifugo HTTP error: {response.status}, response: {response_text}"
+                    )
+                    return False
 
+        except CircuitOpenError:
+            logger.warning(f"Centrifugo circuit open, dropping publish to {channel}")
+            return False
         except aiohttp.ClientError as e:
             logger.error(f"Network error publishing to Centrifugo: {e}")
             return False
@@ -79,6 +395,70 @@ class CentrifugoClient:
             logger.error(f"Unexpected error publishing to Centrifugo: {e}")
             return False
 
+    async def batch(
+        self, commands: List[Dict[str, Any]]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Send several API commands in one request.
+
+        Returns one reply per command (each holding "result" or "error"), or
+        None if the request as a whole failed.
+        """
+        payload = {"method": "batch", "params": {"commands": commands}}
+
+        try:
+            async with self._post(payload) as response:
+                if response.status != 200:
+                    response_text = await response.text()
+                    logger.error(
+                        f"Centrifugo HTTP error: {response.status}, response: {response_text}"
+                    )
+                    return None
+
+                result = await response.json()
+                if result.get("error"):
+                    logger.error(f"Centrifugo batch error: {result['error']}")
+                    return None
+
+                replies = result.get("result", {}).get("replies", [])
+                # Commands without a reply are treated as failed
+                missing = {"error": {"message": "no reply"}}
+                return [
+                    replies[i] if i < len(replies) else missing
+                    for i in range(len(commands))
+                ]
+
+        except CircuitOpenError:
+            logger.warning("Centrifugo circuit open, dropping batch")
+            return None
+        except aiohttp.ClientError as e:
+            logger.error(f"Network error sending batch to Centrifugo: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error sending batch to Centrifugo: {e}")
+            return None
+
+    async def publish_batch(
+        self, publications: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[bool]:
+        """Publish many (channel, data) pairs in a single batch command"""
+        replies = await self.batch(
+            [
+                {"method": "publish", "params": {"channel": channel, "data": data}}
+                for channel, data in publications
+            ]
+        )
+        if replies is None:
+            return [False] * len(publications)
+
+        results = []
+        for (channel, _), reply in zip(publications, replies):
+            if reply.get("error"):
+                logger.error(f"Centrifugo publish error on {channel}: {reply['error']}")
+                results.append(False)
+            else:
+                results.append(True)
+        return results
+
     async def broadcast(self, channels: List[str], data: Dict[str, Any]) -> bool:
         """Broadcast message to multiple channels"""
         payload = {
@@ -86,31 +466,25 @@ class CentrifugoClient:
             "params": {"channels": channels, "data": data},
         }
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"apikey {self.api_key}",
-        }
-
         try:
-            async with aiohttp.ClientSession(timeout=self.timeout) as session:
-                async with session.post(
-                    f"{self.api_url}/api", json=payload, headers=headers
-                ) as response:
-
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get("error"):
-                            logger.error(
-                                f"Centrifugo broadcast error: {result['error']}"
-                            )
-                            return False
-                        return True
-                    else:
-                        response_text = await response.text()
+            async with self._post(payload) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    if result.get("error"):
                         logger.error(
-                            f"Centrifugo HTTP error: {response.status}, response: {response_text}"
+                            f"Centrifugo broadcast error: {result['error']}"
                         )
                         return False
+                    return True
+                else:
+                    response_text = await response.text()
+                    logger.error(
+                        f"Centrifugo HTTP error: {response.status}, response: {response_text}"
+                    )
+                    return False
+        except CircuitOpenError:
+            logger.warning("Centrifugo circuit open, dropping broadcast")
+            return False
         except Exception as e:
             logger.error(f"Error broadcasting to Centrifugo: {e}")
             return False
@@ -119,29 +493,22 @@ class CentrifugoClient:
         """Get online users in a channel"""
         payload = {"method": "presence", "params": {"channel": channel}}
 
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"apikey {self.api_key}",
-        }
-
         try:
-            async with aiohttp.ClientSession(timeout=self.timeout) as session:
-                async with session.post(
-                    f"{self.api_url}/api", json=payload, headers=headers
-                ) as response:
-
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get("error"):
-                            logger.error(
-                                f"Centrifugo presence error: {result['error']}"
-                            )
-                            return None
-
-                        presence_data = result.get("result", {})
-                        return list(presence_data.get("presence", {}).keys())
-                    else:
+            async with self._post(payload) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    if result.get("error"):
+                        logger.error(
+                            f"Centrifugo presence error: {result['error']}"
+                        )
                         return None
+
+                    presence_data = result.get("result", {})
+                    return list(presence_data.get("presence", {}).keys())
+                else:
+                    return None
+        except CircuitOpenError:
+            return None
         except Exception as e:
             logger.error(f"Error getting presence from Centrifugo: {e}")
             return None
@@ -0,0 +1,127 @@
+import gzip
+from typing import Optional
+
+from decouple import config
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional, falls back to gzip
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, falls back to gzip
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+# Suffixes added to the ETag of a compressed representation, so strong
+# ETags stay unique per content coding
+ETAG_SUFFIXES = ("-zstd", "-br", "-gzip")
+
+
+class CompressionMiddleware:
+    """Compresses complete responses with the best coding the client accepts.
+
+    zstd is preferred over brotli over gzip; brotli and zstd are used only
+    when their packages are installed. Bodies under COMPRESSION_MIN_SIZE
+    bytes, already-encoded bodies and streamed responses are sent as they
+    are.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.minimum_size = config("COMPRESSION_MIN_SIZE", 1024, cast=int)
+        self.gzip_level = config("COMPRESSION_GZIP_LEVEL", 6, cast=int)
+        self.brotli_quality = config("COMPRESSION_BROTLI_QUALITY", 4, cast=int)
+        self.zstd_level = config("COMPRESSION_ZSTD_LEVEL", 3, cast=int)
+
+        self.available = ["gzip"]
+        if brotli is not None:
+            self.available.insert(0, "br")
+        if zstandard is not None:
+            self.available.insert(0, "zstd")
+            self.zstd = zstandard.ZstdCompressor(level=self.zstd_level)
+
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        accepted = set()
+        for item in accept_encoding.split(","):
+            coding, _, params = item.strip().partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            if q > 0:
+                accepted.add(coding.strip().lower())
+        for coding in self.available:
+            if coding in accepted:
+                return coding
+        return None
+
+    def compress(self, coding: str, body: bytes) -> bytes:
+        if coding == "zstd":
+            return self.zstd.compress(body)
+        if coding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        streaming = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, streaming
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+            if start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            if message.get("more_body", False):
+                # Streamed body: pass it through untouched
+                streaming = True
+                await send(response_start)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=response_start["headers"])
+            content_type = headers.get("content-type", "")
+            if (
+                len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                await send(response_start)
+                await send(message)
+                return
+
+            body = self.compress(coding, body)
+            headers["Content-Encoding"] = coding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            etag = headers.get("etag")
+            if etag and etag.endswith('"'):
+                headers["ETag"] = f'{etag[:-1]}-{coding}"'
+            await send(response_start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -31,6 +31,9 @@ class Collections:
     CHATS = "chats"
     MESSAGES = "messages"
     USER_SESSIONS = "user_sessions"
+    READ_MARKERS = "read_markers"
+    INBOX = "inbox"
+    MESSAGE_ARCHIVES = "message_archives"
 
 
 # Create database instance
@@ -0,0 +1,67 @@
+from typing import Dict, Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import Response
+
+from models import ChatResponse, MessageResponse
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    """orjson encoding that also handles ObjectId; datetimes come out in
+    the same ISO format serialize_doc produces"""
+    return orjson.dumps(content, default=_default)
+
+
+class MongoJSONResponse(Response):
+    """JSON response for views of Mongo documents, encoded in one pass.
+
+    Returning it skips FastAPI's response_model validation and encoding, so
+    content must already match the declared model. Pre-encoded bytes are
+    sent as they are.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def _model_fields(model) -> Dict[str, Any]:
+    return {
+        name: None if field.is_required() else field.default
+        for name, field in model.model_fields.items()
+    }
+
+
+MESSAGE_FIELDS = _model_fields(MessageResponse)
+CHAT_FIELDS = _model_fields(ChatResponse)
+
+# Only what MessageResponse exposes; _id is returned by default
+MESSAGE_PROJECTION = {name: 1 for name in MESSAGE_FIELDS if name != "id"}
+
+
+def _view(doc: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    view = {name: doc.get(name, default) for name, default in fields.items()}
+    view["id"] = str(doc["_id"])
+    return view
+
+
+def message_view(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """MessageResponse-shaped dict straight from a message document"""
+    return _view(doc, MESSAGE_FIELDS)
+
+
+def chat_view(doc: Dict[str, Any], **fields) -> Dict[str, Any]:
+    """ChatResponse-shaped dict from a chat document plus computed fields"""
+    view = _view(doc, CHAT_FIELDS)
+    view.update(fields)
+    return view
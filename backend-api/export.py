@@ -0,0 +1,103 @@
+import zlib
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, Optional
+
+from decouple import config
+
+from archive import message_archive
+from database import mongodb, Collections
+from encoders import MESSAGE_PROJECTION, dumps, message_view
+from utils import encode_cursor, decode_cursor, keyset_filter
+
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", 500, cast=int)
+# Lines are written out in chunks of about this many bytes
+EXPORT_CHUNK_BYTES = config("EXPORT_CHUNK_BYTES", 64 * 1024, cast=int)
+
+
+def _position(message: Dict[str, Any]):
+    return (message["created_at"], message["_id"])
+
+
+async def _archived_after(chat_id: str, position) -> AsyncIterator[Dict[str, Any]]:
+    while True:
+        batch = await message_archive.read(chat_id, position, 1, EXPORT_BATCH_SIZE)
+        if not batch:
+            return
+        for message in batch:
+            yield message
+        position = _position(batch[-1])
+
+
+async def iter_chat_history(
+    chat_id: str, after: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Every message of a chat after the cursor, oldest first, merging the
+    archive with live messages. Memory stays bounded by the batch size."""
+    query: Dict[str, Any] = {"chat_id": chat_id}
+    position = None
+    if after:
+        position = decode_cursor(after, datetime)
+        query.update(keyset_filter("created_at", after, 1, datetime))
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+    live_cursor = (
+        messages_collection.find(query, MESSAGE_PROJECTION)
+        .sort([("created_at", 1), ("_id", 1)])
+        .batch_size(EXPORT_BATCH_SIZE)
+    )
+    archived_cursor = _archived_after(chat_id, position)
+
+    try:
+        live = await anext(live_cursor, None)
+        archived = await anext(archived_cursor, None)
+        while live is not None or archived is not None:
+            if live is None or (
+                archived is not None and _position(archived) < _position(live)
+            ):
+                yield archived
+                archived = await anext(archived_cursor, None)
+                continue
+            if archived is not None and archived["_id"] == live["_id"]:
+                # Left live by an interrupted archive run
+                archived = await anext(archived_cursor, None)
+            yield live
+            live = await anext(live_cursor, None)
+    finally:
+        await live_cursor.close()
+        await archived_cursor.aclose()
+
+
+async def export_lines(
+    chat_id: str, header: Optional[Dict[str, Any]], after: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """NDJSON export: an optional chat line, one line per message carrying
+    the cursor to resume after it, and an end line with the count"""
+    chunk = bytearray()
+    if header is not None:
+        chunk += dumps({"type": "chat", "chat": header}) + b"\n"
+
+    count = 0
+    async for message in iter_chat_history(chat_id, after):
+        count += 1
+        chunk += dumps(
+            {
+                "type": "message",
+                "cursor": encode_cursor(*_position(message)),
+                "message": message_view(message),
+            }
+        )
+        chunk += b"\n"
+        if len(chunk) >= EXPORT_CHUNK_BYTES:
+            yield bytes(chunk)
+            chunk.clear()
+
+    chunk += dumps({"type": "end", "count": count}) + b"\n"
+    yield bytes(chunk)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
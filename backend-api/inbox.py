@@ -0,0 +1,238 @@
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from decouple import config
+from pymongo import UpdateOne, UpdateMany
+
+from database import mongodb, Collections
+from loaders import load_last_messages
+from utils import keyset_filter
+
+Position = Tuple[datetime, ObjectId]
+
+
+def _after(position: Position) -> Dict[str, Any]:
+    """Messages strictly past a (created_at, _id) read position"""
+    read_at, message_id = position
+    return {
+        "$or": [
+            {"created_at": {"$gt": read_at}},
+            {"created_at": read_at, "_id": {"$gt": message_id}},
+        ]
+    }
+
+
+class InboxStore:
+    """Per-user inbox: one row per (user, chat) with the chat's last message
+    preview, last_activity and the user's unread count.
+
+    Rows are kept current by send_message and the read-marker flush, so a
+    user's chat list is a single range read on (user_id, last_activity).
+    """
+
+    def __init__(self):
+        self.preview_length = config("INBOX_PREVIEW_LENGTH", 200, cast=int)
+        # Users whose inbox is known to be built, so the flag is read once
+        self._built: Set[str] = set()
+
+    def preview(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        content = message.get("content")
+        if content and len(content) > self.preview_length:
+            content = content[: self.preview_length]
+        return {
+            "id": str(message["_id"]),
+            "chat_id": message["chat_id"],
+            "content": content,
+            "sender_id": message["sender_id"],
+            "sender_username": message.get("sender_username"),
+            "message_type": message.get("message_type"),
+            "file_name": message.get("file_name"),
+            "created_at": message["created_at"],
+        }
+
+    async def add_chat(
+        self, chat_id: str, participants: Iterable[str], last_activity: datetime
+    ):
+        """Create inbox rows for a chat's participants if they are missing"""
+        if not isinstance(last_activity, datetime):
+            raise TypeError(
+                f"last_activity must be a datetime, not {type(last_activity).__name__}"
+            )
+        inbox_collection = mongodb.get_collection(Collections.INBOX)
+        await inbox_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"user_id": user_id, "chat_id": chat_id},
+                    {
+                        "$setOnInsert": {
+                            "last_activity": last_activity,
+                            "last_message": None,
+                            "unread_count": 0,
+                        }
+                    },
+                    upsert=True,
+                )
+                for user_id in set(participants)
+            ],
+            ordered=False,
+        )
+
+    async def record_message(self, message: Dict[str, Any]):
+        """Fan a new message out to every participant's row in one round trip"""
+        await self.record_messages([message])
+
+    async def record_messages(self, messages: Iterable[Dict[str, Any]]):
+        """Fan a batch of messages out with one bulk_write: an unread
+        increment per (chat, sender) and one preview update per chat"""
+        unread: Dict[Tuple[str, str], int] = {}
+        latest: Dict[str, Dict[str, Any]] = {}
+        for message in messages:
+            chat_id = message["chat_id"]
+            key = (chat_id, message["sender_id"])
+            unread[key] = unread.get(key, 0) + 1
+            current = latest.get(chat_id)
+            if current is None or message["created_at"] >= current["created_at"]:
+                latest[chat_id] = message
+        if not latest:
+            return
+
+        ops = [
+            UpdateMany(
+                {"chat_id": chat_id, "user_id": {"$ne": sender_id}},
+                {"$inc": {"unread_count": count}},
+            )
+            for (chat_id, sender_id), count in unread.items()
+        ]
+        # Guarded so a slower concurrent send cannot overwrite a newer preview
+        ops += [
+            UpdateMany(
+                {"chat_id": chat_id, "last_activity": {"$lte": message["created_at"]}},
+                {
+                    "$set": {
+                        "last_activity": message["created_at"],
+                        "last_message": self.preview(message),
+                    }
+                },
+            )
+            for chat_id, message in latest.items()
+        ]
+        inbox_collection = mongodb.get_collection(Collections.INBOX)
+        await inbox_collection.bulk_write(ops, ordered=False)
+
+    async def apply_read_markers(self, markers: Iterable[Tuple[str, str, Position]]):
+        """Recompute unread counts for (chat_id, user_id, position) markers"""
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        ops = []
+        for chat_id, user_id, position in markers:
+            unread = await messages_collection.count_documents(
+                {"chat_id": chat_id, "sender_id": {"$ne": user_id}, **_after(position)}
+            )
+            ops.append(
+                UpdateOne(
+                    {"user_id": user_id, "chat_id": chat_id},
+                    {"$set": {"unread_count": unread}},
+                )
+            )
+        if ops:
+            inbox_collection = mongodb.get_collection(Collections.INBOX)
+            await inbox_collection.bulk_write(ops, ordered=False)
+
+    async def list_for_user(
+        self, user_id: str, limit: int, before: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Inbox rows, most recently active first; raises ValueError for a
+        malformed cursor"""
+        inbox_collection = mongodb.get_collection(Collections.INBOX)
+        query = {"user_id": user_id}
+        if before:
+            query.update(keyset_filter("last_activity", before, -1, datetime))
+        return (
+            await inbox_collection.find(query)
+            .sort([("last_activity", -1), ("_id", -1)])
+            .limit(limit)
+            .to_list(limit)
+        )
+
+    async def ensure_built(self, user_id: str):
+        """Build a user's inbox if it predates the inbox.
+
+        Other users' chats create rows in it, so an inbox that is not empty
+        may still be missing chats; the inbox_built_at flag on the user
+        records that it was built.
+        """
+        if user_id in self._built:
+            return
+        users_collection = mongodb.get_collection(Collections.USERS)
+        user = await users_collection.find_one(
+            {"_id": ObjectId(user_id)}, {"inbox_built_at": 1}
+        )
+        if user is not None and "inbox_built_at" not in user:
+            await self.rebuild(user_id)
+        self._built.add(user_id)
+
+    async def rebuild(self, user_id: str) -> int:
+        """Rebuild a user's inbox from their chats, messages and read markers"""
+        users_collection = mongodb.get_collection(Collections.USERS)
+        chats_collection = mongodb.get_collection(Collections.CHATS)
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        markers_collection = mongodb.get_collection(Collections.READ_MARKERS)
+        inbox_collection = mongodb.get_collection(Collections.INBOX)
+
+        chats = await chats_collection.find(
+            {"participants": user_id}, {"created_at": 1, "last_activity": 1}
+        ).to_list(None)
+        if not chats:
+            await self._mark_built(users_collection, user_id)
+            return 0
+
+        chat_ids = [str(chat["_id"]) for chat in chats]
+        last_messages = await load_last_messages(chat_ids)
+        markers = {
+            marker["chat_id"]: (marker["read_at"], marker["message_id"])
+            for marker in await markers_collection.find(
+                {"user_id": user_id, "chat_id": {"$in": chat_ids}}
+            ).to_list(None)
+        }
+
+        ops = []
+        for chat, chat_id in zip(chats, chat_ids):
+            unread_query = {"chat_id": chat_id, "sender_id": {"$ne": user_id}}
+            if chat_id in markers:
+                unread_query.update(_after(markers[chat_id]))
+            unread = await messages_collection.count_documents(unread_query)
+
+            last_message = last_messages.get(chat_id)
+            last_activity = chat.get("last_activity") or chat["created_at"]
+            if last_message and last_message["created_at"] > last_activity:
+                last_activity = last_message["created_at"]
+
+            ops.append(
+                UpdateOne(
+                    {"user_id": user_id, "chat_id": chat_id},
+                    {
+                        "$set": {
+                            "last_activity": last_activity,
+                            "last_message": (
+                                self.preview(last_message) if last_message else None
+                            ),
+                            "unread_count": unread,
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+
+        await inbox_collection.bulk_write(ops, ordered=False)
+        await self._mark_built(users_collection, user_id)
+        return len(ops)
+
+    async def _mark_built(self, users_collection, user_id: str):
+        await users_collection.update_one(
+            {"_id": ObjectId(user_id)}, {"$set": {"inbox_built_at": datetime.now()}}
+        )
+        self._built.add(user_id)
+
+
+# Create inbox store instance
+inbox_store = InboxStore()
@@ -0,0 +1,60 @@
+from typing import Dict, Any, Iterable, List, Optional
+
+from bson import ObjectId
+
+from database import mongodb, Collections
+
+
+class UserLoader:
+    """Per-request loader that resolves usernames with one $in query.
+
+    User IDs are deduplicated across every chat in the request, and IDs
+    already resolved are not queried again.
+    """
+
+    def __init__(self):
+        self.usernames: Dict[str, Optional[str]] = {}
+
+    async def load_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[str]]:
+        user_ids = list(dict.fromkeys(user_ids))
+        missing = [uid for uid in user_ids if uid not in self.usernames]
+
+        if missing:
+            users_collection = mongodb.get_collection(Collections.USERS)
+            object_ids = [ObjectId(uid) for uid in missing if ObjectId.is_valid(uid)]
+            users = await users_collection.find(
+                {"_id": {"$in": object_ids}}, {"username": 1}
+            ).to_list(len(object_ids))
+
+            for uid in missing:
+                self.usernames[uid] = None
+            for user in users:
+                self.usernames[str(user["_id"])] = user.get("username", "Unknown")
+
+        return {uid: self.usernames[uid] for uid in user_ids}
+
+    def participant_usernames(self, participant_ids: Iterable[str]) -> List[str]:
+        """"id||||username" entries for participants that exist, in order"""
+        return [
+            participant_id + "||||" + self.usernames[participant_id]
+            for participant_id in participant_ids
+            if self.usernames.get(participant_id) is not None
+        ]
+
+
+async def load_last_messages(chat_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Latest message of each chat in a single aggregation"""
+    if not chat_ids:
+        return {}
+
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+    # The sort matches the (chat_id, created_at) index, so it needs no
+    # in-memory sort before $group picks each chat's newest message
+    pipeline = [
+        {"$match": {"chat_id": {"$in": chat_ids}}},
+        {"$sort": {"chat_id": 1, "created_at": -1}},
+        {"$group": {"_id": "$chat_id", "message": {"$first": "$$ROOT"}}},
+        {"$project": {"message.outbox": 0}},
+    ]
+    results = await messages_collection.aggregate(pipeline).to_list(len(chat_ids))
+    return {result["_id"]: result["message"] for result in results}
@@ -9,15 +9,23 @@ from fastapi import (
     WebSocket,
     WebSocketDisconnect,
     Request,
+    Response,
+    Query,
 )
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from datetime import datetime
 from bson import ObjectId
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
+import asyncio
+import hashlib
 import json
 import uuid
 import os
 from database import mongodb, Collections
+from compression import CompressionMiddleware
+from encoders import MongoJSONResponse, MESSAGE_PROJECTION, chat_view, message_view
 from models import (
     UserCreate,
     UserResponse,
@@ -27,16 +35,55 @@ from models import (
     ChatResponse,
     MessageCreate,
     MessageResponse,
+    BulkMessageItem,
+    BulkMessageCreate,
     TypingIndicator,
     OnlineStatus,
+    PresenceQuery,
+    ReadAck,
+    SyncRequest,
     ChatType,
     MessageType,
+    UserRole,
+)
+from archive import message_archive
+from auth import (
+    AuthHandler,
+    get_admin_user,
+    get_current_user,
+    get_session_id,
+    password_hasher,
+    user_cache,
+    token_cache,
 )
-from auth import AuthHandler, get_current_user
 from centrifugo_client import centrifugo_client
+from presence import presence_cache
+from loaders import UserLoader
+from export import export_lines, gzip_stream
+from http_cache import CACHE_CONTROL, etag_matches, make_etag, not_modified
+from inbox import inbox_store
+from membership import membership_cache
+from message_cache import message_cache
+from read_markers import ReadMarker, read_marker_store
+from search import ensure_text_index, search_messages
+from sessions import session_store
+from sync import next_seq, iter_chat_messages
+from outbox import OutboxDispatcher, outbox_dispatcher
+from typing_state import typing_state
+from user_search import search_keys, user_search
+from utils import (
+    serialize_doc,
+    encode_cursor,
+    decode_cursor,
+    keyset_filter,
+    direct_chat_key,
+)
 import logging
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
 # Serve uploaded files
 
@@ -52,10 +99,19 @@ app.add_middleware(
     allow_origins=["http://10.10.7.30:3000"],
     allow_credentials=False,
     allow_methods=["*"],
-    allow_headers=["Content-Type", "Authorization"],
+    allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+app.add_middleware(CompressionMiddleware)
 
 UPLOAD_DIRECTORY = "uploads"
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PRESENCE_MAX_CHATS = 200
+MAX_PAGE_SIZE = 100
+SYNC_MAX_MESSAGES = 1000
+BULK_MAX_MESSAGES = 5000
+SEARCH_MAX_QUERY_LENGTH = 200
 os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 
 
@@ -63,72 +119,179 @@ os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
 @app.on_event("startup")
 async def startup_event():
     await mongodb.connect()
+    await centrifugo_client.start()
     # Create indexes
     users_collection = mongodb.get_collection(Collections.USERS)
     await users_collection.create_index("email", unique=True)
     await users_collection.create_index("username", unique=True)
+    await users_collection.create_index([("username_lower", 1), ("_id", 1)])
+    await users_collection.create_index("email_lower")
+    # Users registered before search keys were stored get them backfilled
+    await users_collection.update_many(
+        {"username_lower": {"$exists": False}},
+        [
+            {
+                "$set": {
+                    "username_lower": {"$toLower": "$username"},
+                    "email_lower": {"$toLower": "$email"},
+                }
+            }
+        ],
+    )
+
+    sessions_collection = mongodb.get_collection(Collections.USER_SESSIONS)
+    await sessions_collection.create_index("user_id")
+    await sessions_collection.create_index(
+        "revoked_at", partialFilterExpression={"revoked_at": {"$type": "date"}}
+    )
+    await sessions_collection.create_index("expires_at", expireAfterSeconds=0)
 
     chats_collection = mongodb.get_collection(Collections.CHATS)
     await chats_collection.create_index("participants")
+    try:
+        await chats_collection.create_index(
+            "direct_key",
+            unique=True,
+            partialFilterExpression={"direct_key": {"$exists": True}},
+        )
+    except OperationFailure as e:
+        logger.error(
+            f"Could not create unique direct_key index ({e}); "
+            "run migrate_direct_chats.py to resolve duplicate direct chats"
+        )
+    # Chats created before last_activity was set on creation start from created_at
+    await chats_collection.update_many(
+        {"last_activity": {"$exists": False}},
+        [{"$set": {"last_activity": "$created_at"}}],
+    )
 
     messages_collection = mongodb.get_collection(Collections.MESSAGES)
     await messages_collection.create_index("chat_id")
-    await messages_collection.create_index([("chat_id", 1), ("created_at", -1)])
+    await messages_collection.create_index(
+        [("chat_id", 1), ("created_at", -1), ("_id", -1)]
+    )
+    await messages_collection.create_index(
+        [("chat_id", 1), ("seq", 1)],
+        unique=True,
+        partialFilterExpression={"seq": {"$exists": True}},
+    )
+    await ensure_text_index()
+    await messages_collection.create_index(
+        "outbox.next_attempt_at",
+        partialFilterExpression={"outbox.next_attempt_at": {"$exists": True}},
+    )
+
+    archives_collection = mongodb.get_collection(Collections.MESSAGE_ARCHIVES)
+    await archives_collection.create_index(
+        [("chat_id", 1), ("last_at", -1), ("last_id", -1)]
+    )
+    await archives_collection.create_index(
+        [("chat_id", 1), ("first_at", 1), ("first_id", 1)]
+    )
+
+    await session_store.start()
+    inbox_collection = mongodb.get_collection(Collections.INBOX)
+    await inbox_collection.create_index([("user_id", 1), ("chat_id", 1)], unique=True)
+    await inbox_collection.create_index(
+        [("user_id", 1), ("last_activity", -1), ("_id", -1)]
+    )
+    await inbox_collection.create_index("chat_id")
+
+    read_markers_collection = mongodb.get_collection(Collections.READ_MARKERS)
+    await read_markers_collection.create_index(
+        [("chat_id", 1), ("user_id", 1)], unique=True
+    )
+
+    outbox_dispatcher.start()
+    typing_state.start()
+    read_marker_store.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await read_marker_store.stop()
+    await session_store.stop()
+    await typing_state.stop()
+    await outbox_dispatcher.stop()
+    await centrifugo_client.close()
     await mongodb.close()
+    password_hasher.shutdown()
 
 
 # Utility functions
-def serialize_doc(doc):
-    """Convert MongoDB document to JSON-serializable format (including _id and datetime)."""
-    if not doc:
-        return doc
-
-    # Convert _id to string and rename it to "id"
-    if "_id" in doc:
-        doc["id"] = str(doc["_id"])
-        del doc["_id"]
-
-    # Recursively convert datetime objects
-    for key, value in doc.items():
-        if isinstance(value, datetime):
-            doc[key] = value.isoformat()
-        elif isinstance(value, dict):
-            doc[key] = serialize_doc(value)
-        elif isinstance(value, list):
-            doc[key] = [
-                (
-                    serialize_doc(v)
-                    if isinstance(v, dict)
-                    else (v.isoformat() if isinstance(v, datetime) else v)
-                )
-                for v in value
-            ]
+def history_etag(
+    chat_id: str,
+    page: int,
+    limit: int,
+    before: Optional[str],
+    after: Optional[str],
+    next_cursor: Optional[str],
+    message_ids: Iterable[ObjectId],
+) -> str:
+    """ETag of a page of chat history. Messages are never changed once
+    visible, so the IDs on the page version it; cached and database reads
+    of the same page get the same tag."""
+    return make_etag(
+        "messages", chat_id, page, limit, before, after, next_cursor, *message_ids
+    )
+
 
-    return doc
+def _write_chunk(buffer, digest, chunk: bytes):
+    digest.update(chunk)
+    buffer.write(chunk)
 
 
-def save_upload_file(upload_file: UploadFile) -> dict:
-    """Save uploaded file and return file info"""
+def _commit_upload(buffer, temp_path: str, file_path: str):
+    buffer.flush()
+    os.fsync(buffer.fileno())
+    buffer.close()
+    os.replace(temp_path, file_path)
+
+
+def _discard_upload(buffer, temp_path: str):
+    buffer.close()
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+
+async def save_upload_file(upload_file: UploadFile) -> dict:
+    """Stream an uploaded file to disk and return file info.
+
+    Chunks are hashed and written in the threadpool, so the event loop never
+    blocks on disk I/O, and the size limit is checked as each chunk arrives.
+    The file is written under a temporary name and renamed into place once
+    complete, so a partial upload is never visible.
+    """
     # Generate unique filename
     file_extension = os.path.splitext(upload_file.filename)[1]
     unique_filename = f"{uuid.uuid4()}{file_extension}"
 
     file_path = os.path.join(UPLOAD_DIRECTORY, unique_filename)
+    temp_path = os.path.join(UPLOAD_DIRECTORY, f".{unique_filename}.part")
 
-    # Save file
-    with open(file_path, "wb") as buffer:
-        content = upload_file.file.read()
-        buffer.write(content)
+    digest = hashlib.sha256()
+    size = 0
+    buffer = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="File size too large. Maximum size is 10MB.",
+                )
+            await run_in_threadpool(_write_chunk, buffer, digest, chunk)
+        await run_in_threadpool(_commit_upload, buffer, temp_path, file_path)
+    except BaseException:
+        await run_in_threadpool(_discard_upload, buffer, temp_path)
+        raise
 
     return {
         "file_path": file_path,
         "file_name": upload_file.filename,
-        "file_size": len(content),
+        "file_size": size,
         "file_type": upload_file.content_type,
+        "file_hash": digest.hexdigest(),
     }
 
 
@@ -150,36 +313,48 @@ async def register(user_data: UserCreate):
 
     # Create user
     user_dict = user_data.dict()
-    user_dict["password"] = AuthHandler.get_password_hash(user_data.password)
+    user_dict["password"] = await AuthHandler.hash_password_async(user_data.password)
     user_dict["role"] = "user"
     user_dict["created_at"] = datetime.now()
+    # A new user has no chats, so their inbox starts out complete
+    user_dict["inbox_built_at"] = user_dict["created_at"]
+    user_dict.update(search_keys(user_data.username, user_data.email))
 
     result = await users_collection.insert_one(user_dict)
     user_dict["id"] = str(result.inserted_id)
+    user_search.invalidate()
 
     return UserResponse(**user_dict)
 
 
 @app.post("/auth/login", response_model=Token)
-async def login(login_data: UserLogin):
+async def login(login_data: UserLogin, request: Request):
     users_collection = mongodb.get_collection(Collections.USERS)
 
     user = await users_collection.find_one({"email": login_data.email})
-    if not user or not AuthHandler.verify_password(
-        login_data.password, user["password"]
-    ):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
         )
 
-    # Update online status
-    await users_collection.update_one(
-        {"_id": user["_id"]},
-        {"$set": {"last_seen": datetime.now(), "is_online": True}},
+    valid, new_hash = await AuthHandler.verify_and_update_password(
+        login_data.password, user["password"]
     )
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials"
+        )
 
-    # Create token
-    access_token = AuthHandler.create_access_token(data={"sub": str(user["_id"])})
+    # Update online status, upgrading the stored hash if its cost changed
+    update = {"last_seen": datetime.now(), "is_online": True}
+    if new_hash:
+        update["password"] = new_hash
+    await users_collection.update_one({"_id": user["_id"]}, {"$set": update})
+
+    # Create session and its token
+    access_token = await AuthHandler.create_session_token(
+        str(user["_id"]), user_agent=request.headers.get("user-agent")
+    )
 
     user_response = UserResponse(
         id=str(user["_id"]),
@@ -194,7 +369,10 @@ async def login(login_data: UserLogin):
 
 
 @app.post("/auth/logout")
-async def logout(current_user: UserResponse = Depends(get_current_user)):
+async def logout(
+    current_user: UserResponse = Depends(get_current_user),
+    session_id: Optional[str] = Depends(get_session_id),
+):
     users_collection = mongodb.get_collection(Collections.USERS)
 
     await users_collection.update_one(
@@ -202,9 +380,66 @@ async def logout(current_user: UserResponse = Depends(get_current_user)):
         {"$set": {"is_online": False, "last_seen": datetime.now()}},
     )
 
+    # End this session so the token stops working
+    if session_id:
+        await session_store.revoke(session_id, user_id=current_user.id)
+
     return {"message": "Logged out successfully"}
 
 
+@app.post("/auth/logout-all")
+async def logout_all(current_user: UserResponse = Depends(get_current_user)):
+    users_collection = mongodb.get_collection(Collections.USERS)
+
+    await users_collection.update_one(
+        {"_id": ObjectId(current_user.id)},
+        {"$set": {"is_online": False, "last_seen": datetime.now()}},
+    )
+
+    revoked = await session_store.revoke_user(current_user.id)
+
+    return {"message": "Logged out from all devices", "revoked_sessions": revoked}
+
+
+@app.get("/auth/sessions")
+async def get_sessions(
+    current_user: UserResponse = Depends(get_current_user),
+    session_id: Optional[str] = Depends(get_session_id),
+):
+    sessions = await session_store.list_active(current_user.id)
+    return [
+        {
+            "id": session["_id"],
+            "created_at": session["created_at"].isoformat(),
+            "expires_at": session["expires_at"].isoformat(),
+            "user_agent": session.get("user_agent"),
+            "current": session["_id"] == session_id,
+        }
+        for session in sessions
+    ]
+
+
+@app.delete("/auth/sessions/{target_session_id}")
+async def revoke_session(
+    target_session_id: str, current_user: UserResponse = Depends(get_current_user)
+):
+    if not await session_store.revoke(target_session_id, user_id=current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Session not found"
+        )
+
+    return {"message": "Session revoked"}
+
+
+# Admin APIs
+@app.post("/admin/users/{user_id}/revoke-sessions")
+async def admin_revoke_user_sessions(
+    user_id: str, admin_user: UserResponse = Depends(get_admin_user)
+):
+    revoked = await session_store.revoke_user(user_id)
+    return {"user_id": user_id, "revoked_sessions": revoked}
+
+
 # Centrifugo token endpoint
 @app.get("/centrifugo/token")
 async def get_centrifugo_token(current_user: UserResponse = Depends(get_current_user)):
@@ -222,19 +457,22 @@ async def get_current_user_profile(
 
 @app.get("/users", response_model=List[UserResponse])
 async def get_users(
-    search: Optional[str] = None, current_user: UserResponse = Depends(get_current_user)
+    response: Response,
+    search: Optional[str] = Query(None, max_length=100),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
 ):
-    users_collection = mongodb.get_collection(Collections.USERS)
+    # Prefix match on username or email, ordered by username
+    try:
+        users, next_cursor = await user_search.search(search, limit, after)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-    query = {}
-    if search:
-        query["$or"] = [
-            {"username": {"$regex": search, "$options": "i"}},
-            {"email": {"$regex": search, "$options": "i"}},
-        ]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
-    users = await users_collection.find(query).to_list(100)
-    return [UserResponse(**serialize_doc(user)) for user in users]
+    return [UserResponse(**user) for user in users]
 
 
 # Chat APIs
@@ -243,101 +481,134 @@ async def create_chat(
     chat_data: ChatCreate, current_user: UserResponse = Depends(get_current_user)
 ):
     chats_collection = mongodb.get_collection(Collections.CHATS)
-    users_collection = mongodb.get_collection(Collections.USERS)
-
-    # For direct chats, check if chat already exists
-    if chat_data.chat_type == ChatType.DIRECT:
-        existing_chat = await chats_collection.find_one(
-            {
-                "chat_type": ChatType.DIRECT,
-                "participants": {"$all": chat_data.participants},
-            }
-        )
-
-        if existing_chat:
-            # Add participant_usernames to existing chat
-            existing_chat_data = serialize_doc(existing_chat)
-            # Get participants' usernames for existing chat
-            participant_usernames = []
-            for participant_id in existing_chat_data["participants"]:
-                user = await users_collection.find_one(
-                    {"_id": ObjectId(participant_id)}
-                )
-                if user:
-                    participant_usernames.append(
-                        participant_id + "||||" + user.get("username", "Unknown")
-                    )
-            existing_chat_data["participant_usernames"] = participant_usernames
-            return ChatResponse(**existing_chat_data)
+    user_loader = UserLoader()
 
     # Create chat
     chat_dict = chat_data.dict()
     chat_dict["created_by"] = current_user.id
     chat_dict["created_at"] = datetime.now()
+    chat_dict["last_activity"] = chat_dict["created_at"]
 
     # Ensure creator is in participants
     if current_user.id not in chat_dict["participants"]:
         chat_dict["participants"].append(current_user.id)
 
-    result = await chats_collection.insert_one(chat_dict)
-    chat_dict["id"] = str(result.inserted_id)
-
-    # Get participants' usernames for new chat
-    participant_usernames = []
-    for participant_id in chat_dict["participants"]:
-        user = await users_collection.find_one({"_id": ObjectId(participant_id)})
-        if user:
-            participant_usernames.append(
-                participant_id + "||||" + user.get("username", "Unknown")
+    if chat_data.chat_type == ChatType.DIRECT:
+        # A direct chat is identified by its participant pair, so finding or
+        # creating it is a single atomic upsert on the unique direct_key
+        chat_dict["direct_key"] = direct_chat_key(chat_dict["participants"])
+        try:
+            chat = await chats_collection.find_one_and_update(
+                {"direct_key": chat_dict["direct_key"]},
+                {
+                    "$setOnInsert": {
+                        k: v for k, v in chat_dict.items() if k != "direct_key"
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
             )
-
-    # Add participants usernames to response
-    chat_dict["participant_usernames"] = participant_usernames
+        except DuplicateKeyError:
+            # A concurrent request created it first
+            chat = await chats_collection.find_one(
+                {"direct_key": chat_dict["direct_key"]}
+            )
+        # serialize_doc turns dates into strings; the inbox needs the datetime
+        created_at = chat["created_at"]
+        chat_dict = serialize_doc(chat)
+    else:
+        created_at = chat_dict["created_at"]
+        result = await chats_collection.insert_one(chat_dict)
+        chat_dict["id"] = str(result.inserted_id)
+
+    membership_cache.set(chat_dict["id"], chat_dict["participants"])
+    await inbox_store.add_chat(chat_dict["id"], chat_dict["participants"], created_at)
+
+    # Get participants' usernames
+    await user_loader.load_many(chat_dict["participants"])
+    chat_dict["participant_usernames"] = user_loader.participant_usernames(
+        chat_dict["participants"]
+    )
 
     return ChatResponse(**chat_dict)
 
 
 @app.get("/chats", response_model=List[ChatResponse])
-async def get_user_chats(current_user: UserResponse = Depends(get_current_user)):
+async def get_user_chats(
+    request: Request,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
+):
     chats_collection = mongodb.get_collection(Collections.CHATS)
-    users_collection = mongodb.get_collection(Collections.USERS)
 
-    chats = (
-        await chats_collection.find({"participants": current_user.id})
-        .sort("created_at", -1)
-        .to_list(100)
-    )
+    if not before:
+        # Users who haven't opened their chat list since the inbox was
+        # introduced get theirs built here
+        await inbox_store.ensure_built(current_user.id)
 
-    # Get last message for each chat and participants' usernames
-    messages_collection = mongodb.get_collection(Collections.MESSAGES)
-
-    chat_responses = []
-    for chat in chats:
-        chat_data = serialize_doc(chat)
-
-        # Get last message
-        last_message = await messages_collection.find_one(
-            {"chat_id": chat_data["id"]}, sort=[("created_at", -1)]
-        )
-
-        if last_message:
-            chat_data["last_message"] = serialize_doc(last_message)
-
-        # Get participants' usernames
-        participant_usernames = []
-        for participant_id in chat_data["participants"]:
-            user = await users_collection.find_one({"_id": ObjectId(participant_id)})
-            if user:
-                participant_usernames.append(
-                    participant_id + "||||" + user.get("username", "Unknown")
-                )
-
-        # Add participants usernames to response
-        chat_data["participant_usernames"] = participant_usernames
+    # The inbox holds one row per chat, most recently active first, paged
+    # with a (last_activity, _id) cursor
+    try:
+        rows = await inbox_store.list_for_user(current_user.id, limit + 1, before)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last["last_activity"], last["_id"])
+
+    # Inbox rows change whenever anything shown in the list does, so they
+    # version the page before the chats and users are loaded
+    etag = make_etag(
+        "chats",
+        current_user.id,
+        limit,
+        before,
+        headers.get("X-Next-Cursor"),
+        *(
+            (
+                row["chat_id"],
+                row["last_activity"],
+                row.get("unread_count", 0),
+                (row.get("last_message") or {}).get("id"),
+            )
+            for row in rows
+        ),
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    headers.update({"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    chats = await chats_collection.find(
+        {"_id": {"$in": [ObjectId(row["chat_id"]) for row in rows]}}
+    ).to_list(len(rows))
+    chats_by_id = {str(chat["_id"]): chat for chat in chats}
+
+    user_loader = UserLoader()
+    await user_loader.load_many(
+        participant_id for chat in chats for participant_id in chat["participants"]
+    )
 
-        chat_responses.append(ChatResponse(**chat_data))
+    chat_views = []
+    for row in rows:
+        chat = chats_by_id.get(row["chat_id"])
+        if chat is None:
+            continue
+        fields = {
+            "last_activity": row["last_activity"],
+            "unread_count": row.get("unread_count", 0),
+            "participant_usernames": user_loader.participant_usernames(
+                chat["participants"]
+            ),
+        }
+        if row.get("last_message"):
+            fields["last_message"] = row["last_message"]
+        chat_views.append(chat_view(chat, **fields))
 
-    return chat_responses
+    return MongoJSONResponse(chat_views, headers=headers)
 
 
 @app.get("/chats/{chat_id}", response_model=ChatResponse)
@@ -382,15 +653,10 @@ async def send_message(
                 detail="Chat ID is required.",
             )
 
-        chats_collection = mongodb.get_collection(Collections.CHATS)
         messages_collection = mongodb.get_collection(Collections.MESSAGES)
 
         # Verify chat exists and user is participant
-        chat = await chats_collection.find_one(
-            {"_id": ObjectId(chat_id), "participants": current_user.id}
-        )
-
-        if not chat:
+        if not await membership_cache.is_member(chat_id, current_user.id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Chat not found or access denied",
@@ -400,22 +666,10 @@ async def send_message(
         file_info = None
         if file and message_type == "file":
             try:
-                # Validate file size (e.g., 10MB limit)
-                max_size = 10 * 1024 * 1024
-                file_content = await file.read()
-
-                if len(file_content) > max_size:
-                    raise HTTPException(
-                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                        detail="File size too large. Maximum size is 10MB.",
-                    )
-
-                # Reset file pointer after reading
-                await file.seek(0)
-
-                # Save file and get file info
-                file_info = save_upload_file(file)
-
+                # Streamed to disk; aborts with 413 once past the size limit
+                file_info = await save_upload_file(file)
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -424,6 +678,7 @@ async def send_message(
 
         # Create message document
         message_dict = {
+            "_id": ObjectId(),
             "chat_id": chat_id,
             "content": content,
             "sender_id": current_user.id,
@@ -441,79 +696,511 @@ async def send_message(
                     "file_name": file_info["file_name"],
                     "file_size": file_info["file_size"],
                     "file_type": file_info["file_type"],
+                    "file_hash": file_info["file_hash"],
                 }
             )
 
+        # Per-chat sequence number, so a reconnecting client can ask for
+        # everything after the last one it saw
+        message_dict["seq"] = await next_seq(ObjectId(chat_id))
+
+        # The pending Centrifugo publish is stored with the message itself and
+        # delivered (along with the chat's last_activity) by the outbox dispatcher
+        message_dict["outbox"] = OutboxDispatcher.entry(channel=f"chat-{chat_id}")
+
         # Insert message into database
-        result = await messages_collection.insert_one(message_dict)
-        message_dict["id"] = str(result.inserted_id)
+        await messages_collection.insert_one(message_dict)
+        message_dict["id"] = str(message_dict["_id"])
+        outbox_dispatcher.notify()
+        message_cache.add([message_dict])
 
-        # Serialize for Centrifugo
-        serialized_message = serialize_doc(message_dict.copy())
+        # Update every participant's inbox row (preview, activity, unread)
+        await inbox_store.record_message(message_dict)
+
+        return MessageResponse(**message_dict)
+    except Exception as e:
+        raise e
 
-        # Prepare Centrifugo message data
-        centrifugo_data = {
-            "type": "new_message",
-            "message": serialized_message,
-            "chat_id": chat_id,
-            "sender_id": current_user.id,
-            "timestamp": datetime.now().isoformat(),
-        }
 
-        # Publish to Centrifugo
-        publish_success = await centrifugo_client.publish(
-            channel=f"chat-{chat_id}",
-            data=centrifugo_data,
+@app.post("/messages/bulk")
+async def ingest_messages(
+    bulk: BulkMessageCreate, current_user: UserResponse = Depends(get_current_user)
+):
+    """Insert many messages across chats in one call.
+
+    Membership is checked once per chat and seqs are reserved per chat with
+    one $inc; the messages, chat activity and inbox rows are then each
+    written with a single bulk operation. Realtime events go through the
+    outbox and publish batcher; historical imports can pass publish=false.
+    """
+    if len(bulk.messages) > BULK_MAX_MESSAGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BULK_MAX_MESSAGES} messages per request",
+        )
+    if current_user.role != UserRole.ADMIN and any(
+        item.sender_id or item.created_at for item in bulk.messages
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admins may set sender_id or created_at",
         )
+    if not bulk.messages:
+        return {"inserted": 0, "ids": [], "chats": {}}
 
-        if not publish_success:
-            logger.error(f"Failed to publish message to Centrifugo for chat {chat_id}")
+    by_chat: Dict[str, List[BulkMessageItem]] = {}
+    for item in bulk.messages:
+        by_chat.setdefault(item.chat_id, []).append(item)
 
-        # Update chat's last activity
-        await chats_collection.update_one(
-            {"_id": ObjectId(chat_id)},
-            {"$set": {"last_activity": datetime.now()}},
+    user_loader = UserLoader()
+    usernames = await user_loader.load_many(
+        [current_user.id]
+        + [item.sender_id for item in bulk.messages if item.sender_id]
+    )
+    usernames[current_user.id] = current_user.username
+
+    # Every sender must exist and belong to the chat it is posting in
+    denied = []
+    for chat_id, items in by_chat.items():
+        participants = await membership_cache.get_participants(chat_id)
+        senders = {item.sender_id or current_user.id for item in items}
+        if participants is None or any(
+            sender_id not in participants or usernames.get(sender_id) is None
+            for sender_id in senders
+        ):
+            denied.append(chat_id)
+    if denied:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Chat not found or access denied: {', '.join(denied)}",
         )
 
-        return MessageResponse(**message_dict)
-    except Exception as e:
-        raise e
+    now = datetime.now()
+    messages = []
+    last_seqs = {}
+    for chat_id, items in by_chat.items():
+        last_seq = await next_seq(ObjectId(chat_id), len(items))
+        last_seqs[chat_id] = last_seq
+        for seq, item in enumerate(items, last_seq - len(items) + 1):
+            sender_id = item.sender_id or current_user.id
+            message_dict = {
+                "_id": ObjectId(),
+                "chat_id": chat_id,
+                "content": item.content,
+                "sender_id": sender_id,
+                "sender_username": usernames[sender_id],
+                "message_type": item.message_type,
+                "created_at": item.created_at or now,
+                "reply_to": item.reply_to,
+                "seq": seq,
+            }
+            if bulk.publish:
+                message_dict["outbox"] = OutboxDispatcher.entry(
+                    channel=f"chat-{chat_id}"
+                )
+            messages.append(message_dict)
+
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+    await messages_collection.insert_many(messages, ordered=False)
+    if bulk.publish:
+        outbox_dispatcher.notify()
+    message_cache.add(messages)
+
+    last_activity: Dict[str, datetime] = {}
+    for message in messages:
+        chat_id = message["chat_id"]
+        if message["created_at"] > last_activity.get(chat_id, datetime.min):
+            last_activity[chat_id] = message["created_at"]
+    chats_collection = mongodb.get_collection(Collections.CHATS)
+    await chats_collection.bulk_write(
+        [
+            UpdateOne({"_id": ObjectId(chat_id)}, {"$max": {"last_activity": at}})
+            for chat_id, at in last_activity.items()
+        ],
+        ordered=False,
+    )
+    await inbox_store.record_messages(messages)
+
+    return {
+        "inserted": len(messages),
+        "ids": [str(message["_id"]) for message in messages],
+        "chats": last_seqs,
+    }
+
+
+@app.get("/messages/search", response_model=List[MessageResponse])
+async def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=SEARCH_MAX_QUERY_LENGTH),
+    chat_id: Optional[str] = None,
+    sender_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    sort: str = Query("relevance", pattern="^(relevance|recent)$"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: UserResponse = Depends(get_current_user),
+):
+    # Only chats the caller participates in are searched
+    if chat_id:
+        if not await membership_cache.is_member(chat_id, current_user.id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Chat not found or access denied",
+            )
+        chat_ids = [chat_id]
+    else:
+        chats_collection = mongodb.get_collection(Collections.CHATS)
+        chats = await chats_collection.find(
+            {"participants": current_user.id}, {"_id": 1}
+        ).to_list(None)
+        chat_ids = [str(chat["_id"]) for chat in chats]
+
+    try:
+        messages, next_cursor = await search_messages(
+            q,
+            chat_ids,
+            limit,
+            cursor=cursor,
+            sender_id=sender_id,
+            since=since,
+            until=until,
+            by_relevance=sort == "relevance",
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return MongoJSONResponse(
+        [message_view(message) for message in messages], headers=headers
+    )
 
 
 @app.get("/chats/{chat_id}/messages", response_model=List[MessageResponse])
 async def get_chat_messages(
     chat_id: str,
+    request: Request,
     page: int = 1,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
     current_user: UserResponse = Depends(get_current_user),
 ):
-    chats_collection = mongodb.get_collection(Collections.CHATS)
     messages_collection = mongodb.get_collection(Collections.MESSAGES)
 
     # Verify chat exists and user is participant
-    chat = await chats_collection.find_one(
-        {"_id": ObjectId(chat_id), "participants": current_user.id}
+    if not await membership_cache.is_member(chat_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found or access denied",
+        )
+
+    # The newest page is usually in this worker's recent-message cache
+    first_page = page == 1 and not (before or after)
+    if first_page and limit <= message_cache.per_chat:
+        cached = message_cache.get_page(chat_id, limit)
+        if cached is not None:
+            encoded, next_position, message_ids = cached
+            headers = {}
+            if next_position:
+                headers["X-Next-Cursor"] = encode_cursor(*next_position)
+            etag = history_etag(
+                chat_id,
+                page,
+                limit,
+                before,
+                after,
+                headers.get("X-Next-Cursor"),
+                message_ids,
+            )
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            headers.update({"ETag": etag, "Cache-Control": CACHE_CONTROL})
+            return MongoJSONResponse(encoded, headers=headers)
+
+    # Keyset pagination: "before" walks back through history, "after" walks
+    # forward from a known message. Without a cursor the legacy page/skip
+    # paging is used. One extra row tells us whether another page exists.
+    query = {"chat_id": chat_id}
+    direction = 1 if after else -1
+    try:
+        if before:
+            query.update(keyset_filter("created_at", before, -1, datetime))
+        elif after:
+            query.update(keyset_filter("created_at", after, 1, datetime))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    cursor = messages_collection.find(query, MESSAGE_PROJECTION).sort(
+        [("created_at", direction), ("_id", direction)]
+    )
+    if not (before or after):
+        cursor = cursor.skip((page - 1) * limit)
+    fetch = limit + 1
+    if first_page:
+        # Read enough to seed the cache for the next open of this chat
+        fetch = max(limit, message_cache.per_chat) + 1
+        snapshot = message_cache.snapshot()
+    messages = await cursor.limit(fetch).to_list(fetch)
+
+    # Old messages may have been moved to the archive; it is read whenever
+    # the page reaches back past the newest archived message
+    archived = []
+    newest_archived = await message_archive.newest_position(chat_id)
+    if newest_archived is not None:
+        if after:
+            position = decode_cursor(after)
+            if position < newest_archived:
+                archived = await message_archive.read(chat_id, position, 1, fetch)
+        elif before or page == 1:
+            oldest = messages[-1] if messages else None
+            if len(messages) < fetch or (
+                (oldest["created_at"], oldest["_id"]) < newest_archived
+            ):
+                position = decode_cursor(before) if before else None
+                archived = await message_archive.read(chat_id, position, -1, fetch)
+        elif len(messages) < fetch:
+            # Page/skip paging continues into the archive once it is past
+            # the live messages
+            live_count = await messages_collection.count_documents(
+                {"chat_id": chat_id}
+            )
+            skip = max(0, (page - 1) * limit - live_count)
+            archived = await message_archive.read(chat_id, None, -1, skip + fetch)
+            archived = archived[skip:]
+    if archived:
+        merged = {message["_id"]: message for message in archived}
+        merged.update((message["_id"], message) for message in messages)
+        messages = sorted(
+            merged.values(),
+            key=lambda message: (message["created_at"], message["_id"]),
+            reverse=direction < 0,
+        )[:fetch]
+    if first_page:
+        message_cache.fill(chat_id, messages, snapshot)
+        messages = messages[: limit + 1]
+
+    headers = {}
+    if len(messages) > limit:
+        messages = messages[:limit]
+        last = messages[-1]
+        headers["X-Next-Cursor"] = encode_cursor(last["created_at"], last["_id"])
+
+    if direction < 0:
+        messages.reverse()  # Return in chronological order
+
+    etag = history_etag(
+        chat_id,
+        page,
+        limit,
+        before,
+        after,
+        headers.get("X-Next-Cursor"),
+        (message["_id"] for message in messages),
     )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    headers.update({"ETag": etag, "Cache-Control": CACHE_CONTROL})
 
-    if not chat:
+    # Documents are encoded straight to JSON, skipping model validation
+    return MongoJSONResponse([message_view(msg) for msg in messages], headers=headers)
+
+
+@app.get("/chats/{chat_id}/export")
+async def export_chat_messages(
+    chat_id: str,
+    after: Optional[str] = None,
+    gzip: bool = False,
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Stream a chat's whole history, archive included, as NDJSON.
+
+    Each message line carries a cursor; an interrupted download resumes by
+    passing the last one received as "after". The final line is
+    {"type": "end"}, so a truncated file is easy to detect.
+    """
+    if not await membership_cache.is_member(chat_id, current_user.id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat not found or access denied",
         )
 
-    # Get messages with pagination
-    skip = (page - 1) * limit
-    messages = (
-        await messages_collection.find({"chat_id": chat_id})
-        .sort("created_at", -1)
-        .skip(skip)
-        .limit(limit)
-        .to_list(limit)
+    header = None
+    if after:
+        try:
+            decode_cursor(after, datetime)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    else:
+        chats_collection = mongodb.get_collection(Collections.CHATS)
+        chat = await chats_collection.find_one({"_id": ObjectId(chat_id)})
+        user_loader = UserLoader()
+        await user_loader.load_many(chat["participants"])
+        header = chat_view(
+            chat,
+            participant_usernames=user_loader.participant_usernames(
+                chat["participants"]
+            ),
+        )
+
+    lines = export_lines(chat_id, header, after)
+    filename = f"chat-{chat_id}.ndjson"
+    if gzip:
+        return StreamingResponse(
+            gzip_stream(lines),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'},
+        )
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
-    messages.reverse()  # Return in chronological order
 
-    return [MessageResponse(**serialize_doc(msg)) for msg in messages]
+# Sync APIs
+@app.post("/sync")
+async def sync_changes(
+    query: SyncRequest, current_user: UserResponse = Depends(get_current_user)
+):
+    """Everything the client missed since the per-chat seqs it last saw.
+
+    Chats the client does not know yet come back in "new_chats". Only chats
+    whose seq moved are queried, so the cost follows the size of the gap.
+    The reply's "chats" map holds the seq reached per chat; while "has_more"
+    is set the client calls again with it. With stream=true the whole delta
+    is sent as NDJSON instead of in pages.
+    """
+    chats_collection = mongodb.get_collection(Collections.CHATS)
+    chats = await chats_collection.find({"participants": current_user.id}).to_list(
+        None
+    )
+
+    since = query.chats
+    changed = []
+    new_chats = []
+    for chat in chats:
+        chat_id = str(chat["_id"])
+        if chat_id not in since:
+            new_chats.append(chat)
+        if chat.get("seq", 0) > since.get(chat_id, 0):
+            changed.append(chat_id)
+
+    user_loader = UserLoader()
+    await user_loader.load_many(
+        participant_id for chat in new_chats for participant_id in chat["participants"]
+    )
+    chat_responses = []
+    for chat in new_chats:
+        chat_data = serialize_doc(chat)
+        chat_data["participant_usernames"] = user_loader.participant_usernames(
+            chat_data["participants"]
+        )
+        chat_responses.append(ChatResponse(**chat_data))
+
+    state = {chat_id: since.get(chat_id, 0) for chat_id in changed}
+    state.update({chat.id: since.get(chat.id, 0) for chat in chat_responses})
+
+    if query.stream:
+
+        def line(item) -> str:
+            return json.dumps(jsonable_encoder(item)) + "\n"
+
+        async def stream():
+            for chat in chat_responses:
+                yield line({"type": "chat", "chat": chat})
+            for chat_id in changed:
+                async for message in iter_chat_messages(chat_id, state[chat_id]):
+                    state[chat_id] = message["seq"]
+                    message = MessageResponse(**serialize_doc(message))
+                    yield line({"type": "message", "message": message})
+                yield line(
+                    {"type": "state", "chat_id": chat_id, "seq": state[chat_id]}
+                )
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    limit = min(max(query.limit, 1), SYNC_MAX_MESSAGES)
+    messages = []
+    has_more = False
+    for chat_id in changed:
+        remaining = limit - len(messages)
+        if remaining <= 0:
+            has_more = True
+            break
+        # One extra row tells us whether this chat has more
+        async for message in iter_chat_messages(
+            chat_id, state[chat_id], remaining + 1
+        ):
+            if len(messages) == limit:
+                has_more = True
+                break
+            state[chat_id] = message["seq"]
+            messages.append(MessageResponse(**serialize_doc(message)))
+
+    return {
+        "new_chats": chat_responses,
+        "messages": messages,
+        "chats": state,
+        "has_more": has_more,
+    }
+
+
+# Read marker APIs
+@app.post("/chats/{chat_id}/read")
+async def mark_chat_read(
+    chat_id: str, ack: ReadAck, current_user: UserResponse = Depends(get_current_user)
+):
+    if not await membership_cache.is_member(chat_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found or access denied",
+        )
+
+    # Acks for a position we already hold need no lookup at all
+    pending = read_marker_store.pending_marker(chat_id, current_user.id)
+    if pending is not None and str(pending.message_id) == ack.message_id:
+        return {"status": "coalesced"}
+
+    if not ObjectId.is_valid(ack.message_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid message ID"
+        )
+
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+    message = await messages_collection.find_one(
+        {"_id": ObjectId(ack.message_id), "chat_id": chat_id}, {"created_at": 1}
+    )
+    if not message:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Message not found"
+        )
+
+    advanced = read_marker_store.ack(
+        ReadMarker(
+            chat_id=chat_id,
+            user_id=current_user.id,
+            username=current_user.username,
+            message_id=message["_id"],
+            read_at=message["created_at"],
+        )
+    )
+
+    return {"status": "accepted" if advanced else "coalesced"}
+
+
+@app.get("/chats/{chat_id}/read-markers")
+async def get_read_markers(
+    chat_id: str, current_user: UserResponse = Depends(get_current_user)
+):
+    """Read position of every participant; a marker's cursor can be passed as
+    "after" to the messages endpoint to fetch the first unread messages."""
+    if not await membership_cache.is_member(chat_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat not found or access denied",
+        )
+
+    return {"chat_id": chat_id, "markers": await read_marker_store.get_markers(chat_id)}
 
 
 # Typing indicator API
@@ -521,18 +1208,15 @@ async def get_chat_messages(
 async def send_typing_indicator(
     typing_data: TypingIndicator, current_user: UserResponse = Depends(get_current_user)
 ):
-    # Publish typing indicator to Centrifugo
-    await centrifugo_client.publish(
-        channel=f"chat-{typing_data.chat_id}",
-        data={
-            "type": "typing_indicator",
-            "user_id": current_user.id,
-            "username": current_user.username,
-            "is_typing": typing_data.is_typing,
-        },
+    # Only state transitions and periodic refreshes reach Centrifugo
+    published = await typing_state.update(
+        chat_id=typing_data.chat_id,
+        user_id=current_user.id,
+        username=current_user.username,
+        is_typing=typing_data.is_typing,
     )
 
-    return {"status": "sent"}
+    return {"status": "sent" if published else "coalesced"}
 
 
 # Online status API
@@ -553,23 +1237,65 @@ async def update_online_status(
         100
     )
 
-    for chat in user_chats:
-        await centrifugo_client.publish(
-            channel=f"chat-{str(chat['_id'])}",
-            data={
+    # Queue every chat's publication first so they go out in one batch
+    futures = [
+        await centrifugo_client.batcher.submit(
+            f"chat-{str(chat['_id'])}",
+            {
                 "type": "online_status",
                 "user_id": current_user.id,
                 "username": current_user.username,
                 "is_online": status_data.is_online,
             },
         )
+        for chat in user_chats
+    ]
+    await asyncio.gather(*futures)
 
     return {"status": "updated"}
 
 
+# Presence API
+@app.post("/presence")
+async def get_chats_presence(
+    query: PresenceQuery, current_user: UserResponse = Depends(get_current_user)
+):
+    if len(query.chat_ids) > PRESENCE_MAX_CHATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {PRESENCE_MAX_CHATS} chat IDs per request.",
+        )
+
+    # Only report presence for chats the caller participates in
+    chats_collection = mongodb.get_collection(Collections.CHATS)
+    object_ids = [ObjectId(cid) for cid in query.chat_ids if ObjectId.is_valid(cid)]
+    chats = await chats_collection.find(
+        {"_id": {"$in": object_ids}, "participants": current_user.id}, {"_id": 1}
+    ).to_list(len(object_ids))
+    chat_ids = [str(chat["_id"]) for chat in chats]
+
+    presence = await presence_cache.get_many(
+        [f"chat-{chat_id}" for chat_id in chat_ids], counts_only=query.counts_only
+    )
+
+    result = {}
+    for chat_id in chat_ids:
+        value = presence.get(f"chat-{chat_id}")
+        if value is None or query.counts_only:
+            result[chat_id] = value
+        else:
+            result[chat_id] = {"online_users": value, "num_users": len(value)}
+
+    return {"presence": result}
+
+
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    breaker = centrifugo_client.breaker.snapshot()
+    return {
+        "status": "ok" if breaker["state"] == "closed" else "degraded",
+        "centrifugo": breaker,
+    }
 
 
 # WebSocket endpoint for real-time communication
@@ -620,11 +1346,88 @@ async def debug_centrifugo_online(
     chat_id: str, current_user: UserResponse = Depends(get_current_user)
 ):
     """Check online users in a chat channel"""
-    online_users = await centrifugo_client.get_online_users(f"chat-{chat_id}")
+    online_users = await presence_cache.get_online_users(f"chat-{chat_id}")
 
     return {"chat_id": chat_id, "online_users": online_users or []}
 
 
+@app.get("/debug/centrifugo-pool")
+async def debug_centrifugo_pool(current_user: UserResponse = Depends(get_current_user)):
+    """Connection pool and publish batcher statistics for Centrifugo"""
+    return {
+        "pool": centrifugo_client.pool_stats(),
+        "batcher": centrifugo_client.batcher.stats(),
+    }
+
+
+@app.get("/debug/outbox")
+async def debug_outbox(current_user: UserResponse = Depends(get_current_user)):
+    """Outbox backlog and publish lag"""
+    return await outbox_dispatcher.stats()
+
+
+@app.get("/debug/typing")
+async def debug_typing(current_user: UserResponse = Depends(get_current_user)):
+    """Typing indicator coalescing statistics"""
+    return typing_state.stats()
+
+
+@app.get("/debug/presence-cache")
+async def debug_presence_cache(current_user: UserResponse = Depends(get_current_user)):
+    """Presence cache hit rate and size"""
+    return presence_cache.stats()
+
+
+@app.get("/debug/auth-cache")
+async def debug_auth_cache(current_user: UserResponse = Depends(get_current_user)):
+    """Hit/miss counters for the user and token caches"""
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
+
+
+@app.get("/debug/password-hashing")
+async def debug_password_hashing(
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Queue and run times for the bcrypt thread pool"""
+    return password_hasher.stats()
+
+
+@app.get("/debug/sessions")
+async def debug_sessions(current_user: UserResponse = Depends(get_current_user)):
+    """Size and freshness of the in-memory revocation set"""
+    return session_store.stats()
+
+
+@app.get("/debug/membership-cache")
+async def debug_membership_cache(
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Hit/miss counters for the chat membership cache"""
+    return membership_cache.stats()
+
+
+@app.get("/debug/user-search")
+async def debug_user_search(
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Hit/miss counters for cached user search pages"""
+    return user_search.stats()
+
+
+@app.get("/debug/message-cache")
+async def debug_message_cache(
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Hit rate and memory use of the recent-message cache"""
+    return message_cache.stats()
+
+
+@app.get("/debug/read-markers")
+async def debug_read_markers(current_user: UserResponse = Depends(get_current_user)):
+    """Read acknowledgement coalescing statistics"""
+    return read_marker_store.stats()
+
+
 @app.get("/debug/centrifugo-token")
 async def debug_centrifugo_token(
     current_user: UserResponse = Depends(get_current_user),
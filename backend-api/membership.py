@@ -0,0 +1,59 @@
+from typing import Dict, Any, Iterable, Optional, FrozenSet
+
+from bson import ObjectId
+from decouple import config
+
+from database import mongodb, Collections
+from utils import TTLCache
+
+
+class MembershipCache:
+    """Chat -> participant set, so authorization is a dictionary lookup.
+
+    Entries are LRU-evicted beyond MEMBERSHIP_CACHE_SIZE chats and expire
+    after MEMBERSHIP_CACHE_TTL seconds as a backstop for changes made by
+    other workers; call invalidate() whenever a chat's participants change.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache(
+            max_size=config("MEMBERSHIP_CACHE_SIZE", 10000, cast=int),
+            ttl=config("MEMBERSHIP_CACHE_TTL", 300, cast=float),
+        )
+
+    async def get_participants(self, chat_id: str) -> Optional[FrozenSet[str]]:
+        """Participants of a chat, or None if the chat does not exist"""
+        participants = self.cache.get(chat_id)
+        if participants is not None:
+            return participants
+
+        if not ObjectId.is_valid(chat_id):
+            return None
+
+        chats_collection = mongodb.get_collection(Collections.CHATS)
+        chat = await chats_collection.find_one(
+            {"_id": ObjectId(chat_id)}, {"participants": 1}
+        )
+        if chat is None:
+            return None
+
+        return self.set(chat_id, chat["participants"])
+
+    async def is_member(self, chat_id: str, user_id: str) -> bool:
+        participants = await self.get_participants(chat_id)
+        return participants is not None and user_id in participants
+
+    def set(self, chat_id: str, participants: Iterable[str]) -> FrozenSet[str]:
+        participants = frozenset(participants)
+        self.cache.set(chat_id, participants)
+        return participants
+
+    def invalidate(self, chat_id: str):
+        self.cache.pop(chat_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+# Create membership cache instance
+membership_cache = MembershipCache()
@@ -0,0 +1,154 @@
+import bisect
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from decouple import config
+
+from encoders import dumps, message_view
+from utils import TTLCache
+
+
+class ChatBuffer:
+    """Newest messages of one chat, oldest first, as (key, size, json)"""
+
+    __slots__ = ("entries", "whole", "bytes", "expires_at")
+
+    def __init__(self, whole: bool, expires_at: float):
+        self.entries: List[Tuple[tuple, int, bytes]] = []
+        # True while the buffer holds every message of the chat
+        self.whole = whole
+        self.bytes = 0
+        self.expires_at = expires_at
+
+
+class RecentMessageCache:
+    """Ring buffer of the newest messages per chat, pre-encoded as JSON.
+
+    A chat's buffer is filled by its first page-1 read and kept current by
+    sends on this worker; later page-1 reads are served from memory. Chats
+    are LRU-evicted once the buffers exceed MESSAGE_CACHE_MAX_BYTES, and a
+    buffer expires after MESSAGE_CACHE_TTL seconds as a backstop for
+    messages written by other workers.
+    """
+
+    def __init__(self):
+        self.per_chat = config("MESSAGE_CACHE_PER_CHAT", 50, cast=int)
+        self.max_bytes = config("MESSAGE_CACHE_MAX_BYTES", 64 * 1024 * 1024, cast=int)
+        self.ttl = config("MESSAGE_CACHE_TTL", 60, cast=float)
+
+        self.chats: "OrderedDict[str, ChatBuffer]" = OrderedDict()
+        self.bytes = 0
+        # Chat -> write counter of its latest add(), so a fill from a read
+        # that raced a send is discarded
+        self.writes = 0
+        self.last_write = TTLCache(max_size=100000, ttl=self.ttl)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _prepare(message: Dict[str, Any]) -> Tuple[tuple, int, bytes]:
+        created_at = message["created_at"]
+        if created_at.microsecond % 1000:
+            # Match the millisecond precision of the stored copy, so cached
+            # and database reads of a page are identical
+            created_at = created_at.replace(
+                microsecond=created_at.microsecond // 1000 * 1000
+            )
+            message = {**message, "created_at": created_at}
+        encoded = dumps(message_view(message))
+        return (created_at, message["_id"]), len(encoded), encoded
+
+    def get_page(
+        self, chat_id: str, limit: int
+    ) -> Optional[Tuple[bytes, Optional[tuple], List[ObjectId]]]:
+        """The newest `limit` messages as a JSON array, oldest first, the
+        (created_at, _id) position to page back from if older ones exist and
+        the message IDs; None if the buffer cannot answer"""
+        buffer = self.chats.get(chat_id)
+        if buffer is not None and buffer.expires_at <= time.monotonic():
+            self._drop(chat_id)
+            buffer = None
+        if buffer is None or (len(buffer.entries) < limit and not buffer.whole):
+            self.misses += 1
+            return None
+
+        self.chats.move_to_end(chat_id)
+        self.hits += 1
+        page = buffer.entries[-limit:]
+        has_more = len(buffer.entries) > limit or not buffer.whole
+        encoded = b"[" + b",".join(entry[2] for entry in page) + b"]"
+        ids = [entry[0][1] for entry in page]
+        return encoded, (page[0][0] if has_more else None), ids
+
+    def snapshot(self) -> int:
+        """Token to take before reading messages that will be passed to fill()"""
+        return self.writes
+
+    def fill(self, chat_id: str, newest_first: List[Dict[str, Any]], snapshot: int):
+        """Seed a chat's buffer from a read of up to per_chat + 1 messages"""
+        if (self.last_write.get(chat_id) or 0) > snapshot:
+            return
+        self._drop(chat_id)
+        buffer = ChatBuffer(
+            whole=len(newest_first) <= self.per_chat,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self.chats[chat_id] = buffer
+        self._insert(chat_id, buffer, newest_first[: self.per_chat])
+
+    def add(self, messages: Iterable[Dict[str, Any]]):
+        """Record newly stored messages in the buffers of chats already cached"""
+        for message in messages:
+            self.writes += 1
+            self.last_write.set(message["chat_id"], self.writes)
+            buffer = self.chats.get(message["chat_id"])
+            if buffer is not None:
+                self._insert(message["chat_id"], buffer, [message])
+
+    def _insert(self, chat_id: str, buffer: ChatBuffer, messages):
+        for message in messages:
+            entry = self._prepare(message)
+            # Concurrent sends can finish out of order, so keep it sorted
+            bisect.insort(buffer.entries, entry, key=lambda e: e[0])
+            buffer.bytes += entry[1]
+            self.bytes += entry[1]
+        while len(buffer.entries) > self.per_chat:
+            _, size, _ = buffer.entries.pop(0)
+            buffer.bytes -= size
+            self.bytes -= size
+            buffer.whole = False
+
+        self.chats.move_to_end(chat_id)
+        while self.bytes > self.max_bytes and self.chats:
+            self._drop(next(iter(self.chats)))
+            self.evictions += 1
+
+    def _drop(self, chat_id: str):
+        buffer = self.chats.pop(chat_id, None)
+        if buffer is not None:
+            self.bytes -= buffer.bytes
+
+    def invalidate(self, chat_id: str):
+        self._drop(chat_id)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "chats": len(self.chats),
+            "messages": sum(len(buffer.entries) for buffer in self.chats.values()),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "per_chat": self.per_chat,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+# Create message cache instance
+message_cache = RecentMessageCache()
@@ -0,0 +1,105 @@
+# migrate_direct_chats.py
+"""Backfill direct_key on existing direct chats.
+
+Direct chats that share the same participants are duplicates. The oldest one
+keeps the key; with --merge the others' messages are moved into it and the
+duplicates are deleted, otherwise they are only reported.
+
+    python migrate_direct_chats.py [--merge]
+"""
+import argparse
+import asyncio
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pymongo import UpdateOne
+
+from database import mongodb, Collections
+from models import ChatType
+from utils import direct_chat_key
+
+
+async def migrate(merge: bool):
+    await mongodb.connect()
+    chats_collection = mongodb.get_collection(Collections.CHATS)
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+
+    chats = (
+        await chats_collection.find(
+            {"chat_type": ChatType.DIRECT.value},
+            {"participants": 1, "created_at": 1, "direct_key": 1},
+        )
+        .sort("created_at", 1)
+        .to_list(None)
+    )
+
+    keep = {}
+    duplicates = {}
+    for chat in chats:
+        key = direct_chat_key(chat["participants"])
+        if key not in keep:
+            keep[key] = chat
+        else:
+            duplicates.setdefault(key, []).append(chat)
+
+    ops = [
+        UpdateOne({"_id": chat["_id"]}, {"$set": {"direct_key": key}})
+        for key, chat in keep.items()
+        if chat.get("direct_key") != key
+    ]
+    # Duplicates must not hold the key or the unique index cannot be built
+    ops += [
+        UpdateOne({"_id": chat["_id"]}, {"$unset": {"direct_key": ""}})
+        for dupes in duplicates.values()
+        for chat in dupes
+        if "direct_key" in chat
+    ]
+    if ops:
+        await chats_collection.bulk_write(ops, ordered=False)
+    print(f"✓ direct_key set on {len(keep)} direct chats ({len(ops)} updated)")
+
+    if not duplicates:
+        print("✓ No duplicate direct chats")
+    for key, dupes in duplicates.items():
+        target_id = str(keep[key]["_id"])
+        dupe_ids = [str(chat["_id"]) for chat in dupes]
+        if not merge:
+            print(f"! Duplicates of {target_id}: {', '.join(dupe_ids)}")
+            continue
+
+        # Moved messages drop their seq; it was allocated by the duplicate
+        # chat and would collide with the target's own sequence
+        moved = await messages_collection.update_many(
+            {"chat_id": {"$in": dupe_ids}},
+            {"$set": {"chat_id": target_id}, "$unset": {"seq": ""}},
+        )
+        await chats_collection.delete_many(
+            {"_id": {"$in": [chat["_id"] for chat in dupes]}}
+        )
+        print(
+            f"✓ Merged {len(dupe_ids)} duplicates into {target_id} "
+            f"({moved.modified_count} messages moved)"
+        )
+
+    await chats_collection.create_index(
+        "direct_key",
+        unique=True,
+        partialFilterExpression={"direct_key": {"$exists": True}},
+    )
+    print("✓ Unique direct_key index in place")
+
+    await mongodb.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="move duplicates' messages into the oldest chat and delete them",
+    )
+    args = parser.parse_args()
+    asyncio.run(migrate(args.merge))
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
@@ -67,6 +67,9 @@ class ChatResponse(BaseModel):
     created_by: str
     created_at: datetime
     last_message: Optional[Dict[str, Any]] = None
+    last_activity: Optional[datetime] = None
+    unread_count: int = 0
+    seq: int = 0
 
 
 class MessageCreate(BaseModel):
@@ -88,13 +91,38 @@ class MessageResponse(BaseModel):
     file_name: Optional[str] = None
     file_size: Optional[int] = None
     file_type: Optional[str] = None
+    file_hash: Optional[str] = None
     created_at: datetime
     reply_to: Optional[str] = None
+    seq: Optional[int] = None
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat(), ObjectId: lambda v: str(v)}
 
 
+class BulkMessageItem(BaseModel):
+    chat_id: str
+    content: Optional[str] = None
+    message_type: str = "text"
+    reply_to: Optional[str] = None
+    # Only honoured for admins importing history
+    sender_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    @field_validator("created_at")
+    @classmethod
+    def naive_local_time(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Stored timestamps are naive local time, as from datetime.now()
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone().replace(tzinfo=None)
+        return value
+
+
+class BulkMessageCreate(BaseModel):
+    messages: List[BulkMessageItem]
+    publish: bool = True
+
+
 class TypingIndicator(BaseModel):
     chat_id: str
     user_id: str
@@ -107,3 +135,18 @@ class OnlineStatus(BaseModel):
     username: str
     is_online: bool
     last_seen: datetime
+
+
+class ReadAck(BaseModel):
+    message_id: str
+
+
+class PresenceQuery(BaseModel):
+    chat_ids: List[str]
+    counts_only: bool = False
+
+
+class SyncRequest(BaseModel):
+    chats: Dict[str, int] = {}  # chat ID -> last seq the client has
+    limit: int = 500
+    stream: bool = False
@@ -0,0 +1,251 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+import logging
+
+from bson import ObjectId
+from decouple import config
+from pymongo import UpdateOne
+
+from database import mongodb, Collections
+from centrifugo_client import centrifugo_client
+from utils import serialize_doc
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """Publishes stored messages to Centrifugo in the background.
+
+    The pending publish is embedded in the message document under "outbox",
+    so storing the message and recording the publish is a single atomic
+    insert. Entries are retried with exponential backoff until they succeed
+    (at-least-once delivery) or run out of attempts.
+    """
+
+    def __init__(self):
+        self.poll_interval = config("OUTBOX_POLL_INTERVAL", 1.0, cast=float)
+        self.batch_size = config("OUTBOX_BATCH_SIZE", 100, cast=int)
+        self.lease_seconds = config("OUTBOX_LEASE_SECONDS", 30, cast=int)
+        self.backoff_base = config("OUTBOX_BACKOFF_BASE", 0.5, cast=float)
+        self.backoff_max = config("OUTBOX_BACKOFF_MAX", 60, cast=float)
+        self.max_attempts = config("OUTBOX_MAX_ATTEMPTS", 10, cast=int)
+
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+        self.published = 0
+        self.failed_attempts = 0
+        self.dead = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.last_lag = 0.0
+
+    @staticmethod
+    def entry(channel: str, event: str = "new_message") -> Dict[str, Any]:
+        """Outbox entry to embed in a document at insert time"""
+        return {
+            "channel": channel,
+            "event": event,
+            "attempts": 0,
+            "next_attempt_at": datetime.now(),
+        }
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.task:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    def notify(self):
+        """Wake the dispatcher right away instead of waiting for the next poll"""
+        self.wake.set()
+
+    async def _run(self):
+        while True:
+            self.wake.clear()
+            try:
+                processed = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox dispatch error: {e}")
+                processed = 0
+
+            # A full batch means there is probably more waiting
+            if processed >= self.batch_size:
+                continue
+
+            try:
+                await asyncio.wait_for(self.wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def dispatch_once(self) -> int:
+        """Claim a batch of due entries, publish them and record the outcome"""
+        if not centrifugo_client.breaker.accepting:
+            # Centrifugo is down: leave entries buffered until it recovers
+            return 0
+
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        now = datetime.now()
+
+        due = (
+            await messages_collection.find(
+                {"outbox.next_attempt_at": {"$lte": now}}, {"_id": 1}
+            )
+            .sort("outbox.next_attempt_at", 1)
+            .limit(self.batch_size)
+            .to_list(self.batch_size)
+        )
+        if not due:
+            return 0
+
+        # Lease the entries so other workers skip them while we publish
+        claim = uuid.uuid4().hex
+        ids = [doc["_id"] for doc in due]
+        await messages_collection.update_many(
+            {"_id": {"$in": ids}, "outbox.next_attempt_at": {"$lte": now}},
+            {
+                "$set": {
+                    "outbox.next_attempt_at": now
+                    + timedelta(seconds=self.lease_seconds),
+                    "outbox.claim": claim,
+                }
+            },
+        )
+        claimed = await messages_collection.find(
+            {"_id": {"$in": ids}, "outbox.claim": claim}
+        ).to_list(len(ids))
+        if not claimed:
+            return 0
+
+        futures = [
+            await centrifugo_client.batcher.submit(
+                doc["outbox"]["channel"], self.build_payload(doc)
+            )
+            for doc in claimed
+        ]
+        results = await asyncio.gather(*futures)
+
+        message_ops = []
+        last_activity = {}
+        published_at = datetime.now()
+        for doc, success in zip(claimed, results):
+            chat_id = doc["chat_id"]
+            if (
+                chat_id not in last_activity
+                or doc["created_at"] > last_activity[chat_id]
+            ):
+                last_activity[chat_id] = doc["created_at"]
+
+            if success:
+                message_ops.append(
+                    UpdateOne({"_id": doc["_id"]}, {"$unset": {"outbox": ""}})
+                )
+                self._record_lag((published_at - doc["created_at"]).total_seconds())
+                continue
+
+            self.failed_attempts += 1
+            attempts = doc["outbox"].get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                self.dead += 1
+                logger.error(
+                    f"Giving up publishing message {doc['_id']} after {attempts} attempts"
+                )
+                update = {
+                    "$set": {
+                        "outbox.attempts": attempts,
+                        "outbox.dead_at": published_at,
+                    },
+                    "$unset": {"outbox.next_attempt_at": "", "outbox.claim": ""},
+                }
+            else:
+                delay = min(
+                    self.backoff_base * (2 ** (attempts - 1)), self.backoff_max
+                )
+                update = {
+                    "$set": {
+                        "outbox.attempts": attempts,
+                        "outbox.next_attempt_at": published_at
+                        + timedelta(seconds=delay),
+                    },
+                    "$unset": {"outbox.claim": ""},
+                }
+            message_ops.append(UpdateOne({"_id": doc["_id"]}, update))
+
+        await messages_collection.bulk_write(message_ops, ordered=False)
+
+        # $max keeps this idempotent when an entry is delivered more than once
+        chats_collection = mongodb.get_collection(Collections.CHATS)
+        await chats_collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": ObjectId(chat_id)}, {"$max": {"last_activity": ts}}
+                )
+                for chat_id, ts in last_activity.items()
+            ],
+            ordered=False,
+        )
+
+        return len(claimed)
+
+    @staticmethod
+    def build_payload(doc: Dict[str, Any]) -> Dict[str, Any]:
+        message = {k: v for k, v in doc.items() if k != "outbox"}
+        serialized_message = serialize_doc(message)
+        return {
+            "type": doc["outbox"].get("event", "new_message"),
+            "message": serialized_message,
+            "chat_id": doc["chat_id"],
+            "sender_id": doc["sender_id"],
+            "timestamp": datetime.now().isoformat(),
+        }
+
+    def _record_lag(self, lag: float):
+        self.published += 1
+        self.lag_total += lag
+        self.last_lag = lag
+        self.lag_max = max(self.lag_max, lag)
+
+    async def stats(self) -> Dict[str, Any]:
+        messages_collection = mongodb.get_collection(Collections.MESSAGES)
+        pending = await messages_collection.count_documents(
+            {"outbox.next_attempt_at": {"$exists": True}}
+        )
+        oldest = await messages_collection.find_one(
+            {"outbox.next_attempt_at": {"$exists": True}},
+            {"created_at": 1},
+            sort=[("outbox.next_attempt_at", 1)],
+        )
+        oldest_age = (
+            (datetime.now() - oldest["created_at"]).total_seconds() if oldest else 0.0
+        )
+
+        return {
+            "running": bool(self.task and not self.task.done()),
+            "pending": pending,
+            "oldest_pending_age_seconds": round(oldest_age, 3),
+            "published": self.published,
+            "failed_attempts": self.failed_attempts,
+            "dead": self.dead,
+            "last_lag_seconds": round(self.last_lag, 3),
+            "max_lag_seconds": round(self.lag_max, 3),
+            "avg_lag_seconds": (
+                round(self.lag_total / self.published, 3) if self.published else 0.0
+            ),
+        }
+
+
+# Create outbox dispatcher instance
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from decouple import config
+
+from centrifugo_client import centrifugo_client
+
+
+class PresenceCache:
+    """TTL cache in front of Centrifugo presence lookups.
+
+    Misses for many channels are fetched with a single batch command, and
+    concurrent requests for the same channel share one in-flight lookup.
+    """
+
+    def __init__(self):
+        self.ttl = config("PRESENCE_CACHE_TTL", 2.0, cast=float)
+        self.max_entries = config("PRESENCE_CACHE_MAX_ENTRIES", 10000, cast=int)
+
+        # (kind, channel) -> (expires_at, value)
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self.inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_online_users(self, channel: str) -> Optional[List[str]]:
+        result = await self.get_many([channel])
+        return result[channel]
+
+    async def get_many(
+        self, channels: List[str], counts_only: bool = False
+    ) -> Dict[str, Any]:
+        """Presence for each channel: a list of user IDs, or counts when
+        counts_only is set. Channels that could not be fetched map to None.
+        """
+        kind = "stats" if counts_only else "presence"
+        now = time.monotonic()
+
+        results: Dict[str, Any] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        to_fetch: List[str] = []
+
+        for channel in dict.fromkeys(channels):
+            key = (kind, channel)
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                results[channel] = entry[1]
+            elif key in self.inflight:
+                self.coalesced += 1
+                waiting[channel] = self.inflight[key]
+            else:
+                self.misses += 1
+                future = asyncio.get_running_loop().create_future()
+                self.inflight[key] = future
+                waiting[channel] = future
+                to_fetch.append(channel)
+
+        if to_fetch:
+            await self._fetch(kind, to_fetch)
+
+        for channel, future in waiting.items():
+            results[channel] = await future
+
+        return results
+
+    async def _fetch(self, kind: str, channels: List[str]):
+        method = "presence_stats" if kind == "stats" else "presence"
+        values: Dict[str, Any] = {}
+        try:
+            replies = await centrifugo_client.batch(
+                [{"method": method, "params": {"channel": ch}} for ch in channels]
+            )
+            for channel, reply in zip(channels, replies or []):
+                if reply.get("error"):
+                    continue
+                values[channel] = self._parse(kind, reply.get("result", {}))
+        finally:
+            expires_at = time.monotonic() + self.ttl
+            for channel in channels:
+                key = (kind, channel)
+                value = values.get(channel)
+                # Failed lookups are not cached so the next request retries
+                if value is not None:
+                    self._store(key, expires_at, value)
+                future = self.inflight.pop(key, None)
+                if future and not future.done():
+                    future.set_result(value)
+
+    @staticmethod
+    def _parse(kind: str, result: Dict[str, Any]) -> Any:
+        if kind == "stats":
+            return {
+                "num_clients": result.get("num_clients", 0),
+                "num_users": result.get("num_users", 0),
+            }
+
+        # presence is keyed by client ID; one user may have several clients
+        users = dict.fromkeys(
+            info.get("user") or client_id
+            for client_id, info in result.get("presence", {}).items()
+        )
+        return list(users)
+
+    def _store(self, key: Tuple[str, str], expires_at: float, value: Any):
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self.entries),
+            "inflight": len(self.inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (
+                round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0
+            ),
+            "ttl": self.ttl,
+        }
+
+
+# Create presence cache instance
+presence_cache = PresenceCache()
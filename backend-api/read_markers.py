@@ -0,0 +1,235 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from bson import ObjectId
+from decouple import config
+from pymongo import UpdateOne
+
+from database import mongodb, Collections
+from centrifugo_client import centrifugo_client
+from inbox import inbox_store
+from utils import TTLCache, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+
+class ReadMarker:
+    __slots__ = ("chat_id", "user_id", "username", "message_id", "read_at")
+
+    def __init__(
+        self,
+        chat_id: str,
+        user_id: str,
+        username: str,
+        message_id: ObjectId,
+        read_at: datetime,
+    ):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.username = username
+        self.message_id = message_id
+        self.read_at = read_at
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "ReadMarker":
+        return cls(
+            doc["chat_id"],
+            doc["user_id"],
+            doc.get("username"),
+            doc["message_id"],
+            doc["read_at"],
+        )
+
+    def position(self) -> Tuple[datetime, ObjectId]:
+        return (self.read_at, self.message_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "user_id": self.user_id,
+            "username": self.username,
+            "message_id": str(self.message_id),
+            "read_at": self.read_at.isoformat(),
+            "cursor": encode_cursor(self.read_at, self.message_id),
+        }
+
+
+class ReadMarkerStore:
+    """Per-user, per-chat read positions with coalesced acknowledgements.
+
+    Acks only update an in-memory map that keeps the furthest position per
+    (chat, user). Every READ_MARKER_FLUSH_INTERVAL seconds the map is written
+    with one bulk_write and each chat that changed gets one read_receipts
+    publication, however many acks arrived in between.
+    """
+
+    def __init__(self):
+        self.flush_interval = config("READ_MARKER_FLUSH_INTERVAL", 1.0, cast=float)
+
+        self.pending: Dict[Tuple[str, str], ReadMarker] = {}
+        # Recently flushed positions, so late acks cannot move a marker back
+        self.flushed = TTLCache(
+            max_size=config("READ_MARKER_CACHE_SIZE", 50000, cast=int),
+            ttl=config("READ_MARKER_CACHE_TTL", 600, cast=float),
+        )
+        self.task: Optional[asyncio.Task] = None
+
+        self.acks = 0
+        self.flushes = 0
+        self.written = 0
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.task:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+        await self.flush()
+
+    def ack(self, marker: ReadMarker) -> bool:
+        """Record a read position; returns False if it does not move forward"""
+        self.acks += 1
+        key = (marker.chat_id, marker.user_id)
+        current = self.pending.get(key) or self.flushed.get(key)
+        if current is not None and marker.position() <= current.position():
+            return False
+        self.pending[key] = marker
+        return True
+
+    def pending_marker(self, chat_id: str, user_id: str) -> Optional[ReadMarker]:
+        return self.pending.get((chat_id, user_id))
+
+    async def get_markers(self, chat_id: str) -> List[Dict[str, Any]]:
+        """Stored markers for a chat, overlaid with not-yet-flushed acks"""
+        markers_collection = mongodb.get_collection(Collections.READ_MARKERS)
+        docs = await markers_collection.find({"chat_id": chat_id}).to_list(None)
+
+        markers = {doc["user_id"]: ReadMarker.from_doc(doc) for doc in docs}
+        for (pending_chat_id, user_id), marker in self.pending.items():
+            if pending_chat_id != chat_id:
+                continue
+            stored = markers.get(user_id)
+            if stored is None or marker.position() > stored.position():
+                markers[user_id] = marker
+
+        return [marker.to_dict() for marker in markers.values()]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing read markers: {e}")
+
+    async def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+
+        markers_collection = mongodb.get_collection(Collections.READ_MARKERS)
+        ops = []
+        for marker in pending.values():
+            # Pipeline update so a stale flush from another worker never moves
+            # a marker backwards; positions compare by (read_at, message_id)
+            # as in ack, since messages can share a timestamp
+            stored_at = {"$ifNull": ["$read_at", datetime.min]}
+            newer = {
+                "$or": [
+                    {"$gt": [marker.read_at, stored_at]},
+                    {
+                        "$and": [
+                            {"$eq": [marker.read_at, stored_at]},
+                            {"$gt": [marker.message_id, "$message_id"]},
+                        ]
+                    },
+                ]
+            }
+            ops.append(
+                UpdateOne(
+                    {"chat_id": marker.chat_id, "user_id": marker.user_id},
+                    [
+                        {
+                            "$set": {
+                                "username": marker.username,
+                                "message_id": {
+                                    "$cond": [newer, marker.message_id, "$message_id"]
+                                },
+                                "read_at": {
+                                    "$cond": [newer, marker.read_at, "$read_at"]
+                                },
+                                "updated_at": datetime.now(),
+                            }
+                        }
+                    ],
+                    upsert=True,
+                )
+            )
+        try:
+            await markers_collection.bulk_write(ops, ordered=False)
+        except Exception:
+            # Put the markers back unless newer acks arrived meanwhile
+            for key, marker in pending.items():
+                current = self.pending.get(key)
+                if current is None or marker.position() > current.position():
+                    self.pending[key] = marker
+            raise
+
+        self.flushes += 1
+        self.written += len(ops)
+
+        # The guard may have kept a newer marker written by another worker
+        # or an earlier flush this worker no longer remembers, so what
+        # follows uses the stored positions and only markers this flush moved
+        docs = await markers_collection.find(
+            {
+                "$or": [
+                    {"chat_id": chat_id, "user_id": user_id}
+                    for chat_id, user_id in pending
+                ]
+            }
+        ).to_list(None)
+        stored = {(doc["chat_id"], doc["user_id"]): doc for doc in docs}
+        moved: List[ReadMarker] = []
+        for key, marker in pending.items():
+            doc = stored.get(key)
+            current = ReadMarker.from_doc(doc) if doc else marker
+            self.flushed.set(key, current)
+            if current.position() == marker.position():
+                moved.append(current)
+
+        await inbox_store.apply_read_markers(
+            (marker.chat_id, marker.user_id, marker.position()) for marker in moved
+        )
+
+        by_chat: Dict[str, List[Dict[str, Any]]] = {}
+        for marker in moved:
+            by_chat.setdefault(marker.chat_id, []).append(marker.to_dict())
+        for chat_id, receipts in by_chat.items():
+            await centrifugo_client.batcher.submit(
+                f"chat-{chat_id}",
+                {"type": "read_receipts", "chat_id": chat_id, "receipts": receipts},
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.pending),
+            "acks": self.acks,
+            "flushes": self.flushes,
+            "written": self.written,
+            "coalesced": self.acks - self.written - len(self.pending),
+            "flush_interval": self.flush_interval,
+        }
+
+
+# Create read marker store instance
+read_marker_store = ReadMarkerStore()
@@ -0,0 +1,38 @@
+# rebuild_inbox.py
+"""Rebuild the per-user inbox from chats, messages and read markers.
+
+    python rebuild_inbox.py [user_id ...]
+
+Without user IDs every user's inbox is rebuilt.
+"""
+import asyncio
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import mongodb, Collections
+from inbox import inbox_store
+
+
+async def rebuild(user_ids):
+    await mongodb.connect()
+
+    if not user_ids:
+        users_collection = mongodb.get_collection(Collections.USERS)
+        users = await users_collection.find({}, {"_id": 1}).to_list(None)
+        user_ids = [str(user["_id"]) for user in users]
+
+    total = 0
+    for user_id in user_ids:
+        rows = await inbox_store.rebuild(user_id)
+        total += rows
+        print(f"✓ {user_id}: {rows} inbox rows")
+
+    print(f"Rebuilt {total} inbox rows for {len(user_ids)} users")
+    await mongodb.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild(sys.argv[1:]))
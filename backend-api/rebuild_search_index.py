@@ -0,0 +1,46 @@
+# rebuild_search_index.py
+"""Build (or with --force rebuild) the message full-text search index.
+
+The index covers content and file_name of every stored message. The API
+creates it at startup if it is missing; run this after changing its
+definition or to rebuild it for existing data ahead of a deploy.
+
+    python rebuild_search_index.py [--force]
+"""
+import argparse
+import asyncio
+import sys
+import os
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import mongodb, Collections
+from search import ensure_text_index, TEXT_INDEX_NAME
+
+
+async def rebuild(force: bool):
+    await mongodb.connect()
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+
+    started = time.monotonic()
+    built = await ensure_text_index(rebuild=force)
+    elapsed = time.monotonic() - started
+
+    count = await messages_collection.estimated_document_count()
+    if built:
+        print(f"✓ Built {TEXT_INDEX_NAME} over ~{count} messages in {elapsed:.1f}s")
+    else:
+        print(f"✓ {TEXT_INDEX_NAME} is up to date (use --force to rebuild)")
+
+    await mongodb.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--force", action="store_true", help="drop and rebuild an existing index"
+    )
+    args = parser.parse_args()
+    asyncio.run(rebuild(args.force))
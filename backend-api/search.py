@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from database import mongodb, Collections
+from utils import encode_cursor, decode_cursor, keyset_filter
+
+TEXT_INDEX_NAME = "message_text"
+TEXT_INDEX_KEYS = [("content", "text"), ("file_name", "text")]
+TEXT_INDEX_WEIGHTS = {"content": 10, "file_name": 5}
+
+
+async def ensure_text_index(rebuild: bool = False) -> bool:
+    """Create the message text index; returns True if it was (re)built.
+
+    A collection can only hold one text index, so an existing one with a
+    different definition is dropped first, as is ours when rebuild is set.
+    """
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+    indexes = await messages_collection.index_information()
+    for name, info in indexes.items():
+        if not any(kind == "text" for _, kind in info["key"]):
+            continue
+        if name == TEXT_INDEX_NAME and info.get("weights") == TEXT_INDEX_WEIGHTS:
+            if not rebuild:
+                return False
+        await messages_collection.drop_index(name)
+
+    await messages_collection.create_index(
+        TEXT_INDEX_KEYS, name=TEXT_INDEX_NAME, weights=TEXT_INDEX_WEIGHTS
+    )
+    return True
+
+
+async def search_messages(
+    text: str,
+    chat_ids: List[str],
+    limit: int,
+    cursor: Optional[str] = None,
+    sender_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    by_relevance: bool = True,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Messages in chat_ids matching a text query, with the next cursor.
+
+    Results are ordered by text score (then _id) or, with by_relevance
+    False, newest first; both orders page with a keyset cursor. Raises
+    ValueError for a malformed cursor.
+    """
+    if cursor:
+        # A cursor from the other ordering would silently match nothing
+        decode_cursor(cursor, float if by_relevance else datetime)
+
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+    query: Dict[str, Any] = {
+        "$text": {"$search": text},
+        "chat_id": {"$in": chat_ids},
+    }
+    if sender_id:
+        query["sender_id"] = sender_id
+    if since or until:
+        query["created_at"] = {}
+        if since:
+            query["created_at"]["$gte"] = since
+        if until:
+            query["created_at"]["$lt"] = until
+
+    if by_relevance:
+        pipeline = [
+            {"$match": query},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+        ]
+        if cursor:
+            pipeline.append({"$match": keyset_filter("score", cursor, -1)})
+        pipeline += [
+            {"$sort": {"score": -1, "_id": -1}},
+            {"$limit": limit + 1},
+            {"$project": {"outbox": 0}},
+        ]
+        messages = await messages_collection.aggregate(pipeline).to_list(limit + 1)
+        sort_field = "score"
+    else:
+        if cursor:
+            query.update(keyset_filter("created_at", cursor, -1))
+        messages = (
+            await messages_collection.find(query, {"outbox": 0})
+            .sort([("created_at", -1), ("_id", -1)])
+            .limit(limit + 1)
+            .to_list(limit + 1)
+        )
+        sort_field = "created_at"
+
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        last = messages[-1]
+        next_cursor = encode_cursor(last[sort_field], last["_id"])
+    for message in messages:
+        message.pop("score", None)
+    return messages, next_cursor
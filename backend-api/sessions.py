@@ -0,0 +1,172 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import logging
+
+from decouple import config
+
+from database import mongodb, Collections
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore:
+    """Login sessions in Mongo plus an in-memory set of revoked session IDs.
+
+    Each access token carries its session ID as the "jti" claim. Revocations
+    are written to the sessions collection with a revoked_at timestamp and
+    every worker pulls new ones every SESSION_SYNC_INTERVAL seconds, so a
+    revocation takes effect everywhere within seconds while the per-request
+    check stays a set lookup.
+    """
+
+    def __init__(self):
+        self.sync_interval = config("SESSION_SYNC_INTERVAL", 2.0, cast=float)
+        # Re-read a little history each sync to tolerate clock skew between workers
+        self.sync_overlap = timedelta(
+            seconds=config("SESSION_SYNC_OVERLAP", 5.0, cast=float)
+        )
+
+        # session ID -> token expiry; entries are dropped once the token expires
+        self.revoked: Dict[str, datetime] = {}
+        self.synced_until: Optional[datetime] = None
+        self.last_sync = 0.0
+        self.syncs = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self.load()
+        if self.task and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.task:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    def is_revoked(self, session_id: Optional[str]) -> bool:
+        return session_id is not None and session_id in self.revoked
+
+    async def create(
+        self,
+        session_id: str,
+        user_id: str,
+        expires_at: datetime,
+        user_agent: Optional[str] = None,
+    ):
+        sessions_collection = mongodb.get_collection(Collections.USER_SESSIONS)
+        await sessions_collection.insert_one(
+            {
+                "_id": session_id,
+                "user_id": user_id,
+                "created_at": datetime.utcnow(),
+                "expires_at": expires_at,
+                "user_agent": user_agent,
+                "revoked_at": None,
+            }
+        )
+
+    async def list_active(self, user_id: str) -> List[Dict[str, Any]]:
+        sessions_collection = mongodb.get_collection(Collections.USER_SESSIONS)
+        return await sessions_collection.find(
+            {
+                "user_id": user_id,
+                "revoked_at": None,
+                "expires_at": {"$gt": datetime.utcnow()},
+            }
+        ).to_list(100)
+
+    async def revoke(self, session_id: str, user_id: Optional[str] = None) -> bool:
+        """Revoke one session; user_id restricts it to that user's sessions"""
+        sessions_collection = mongodb.get_collection(Collections.USER_SESSIONS)
+        query = {"_id": session_id, "revoked_at": None}
+        if user_id is not None:
+            query["user_id"] = user_id
+
+        session = await sessions_collection.find_one_and_update(
+            query, {"$set": {"revoked_at": datetime.utcnow()}}
+        )
+        if session is None:
+            return False
+
+        # Take effect on this worker immediately; others catch up on sync
+        self.revoked[session_id] = session["expires_at"]
+        return True
+
+    async def revoke_user(self, user_id: str) -> int:
+        """Revoke every active session of a user ("log out all devices")"""
+        sessions_collection = mongodb.get_collection(Collections.USER_SESSIONS)
+        sessions = await sessions_collection.find(
+            {"user_id": user_id, "revoked_at": None}, {"expires_at": 1}
+        ).to_list(None)
+        if not sessions:
+            return 0
+
+        await sessions_collection.update_many(
+            {"_id": {"$in": [s["_id"] for s in sessions]}, "revoked_at": None},
+            {"$set": {"revoked_at": datetime.utcnow()}},
+        )
+        for session in sessions:
+            self.revoked[session["_id"]] = session["expires_at"]
+        return len(sessions)
+
+    async def load(self):
+        """Load all revoked sessions whose tokens have not expired yet"""
+        sessions_collection = mongodb.get_collection(Collections.USER_SESSIONS)
+        now = datetime.utcnow()
+        sessions = await sessions_collection.find(
+            {"revoked_at": {"$type": "date"}, "expires_at": {"$gt": now}},
+            {"expires_at": 1},
+        ).to_list(None)
+        self.revoked = {s["_id"]: s["expires_at"] for s in sessions}
+        self.synced_until = now
+        self.last_sync = time.monotonic()
+        logger.info(f"Loaded {len(self.revoked)} revoked sessions")
+
+    async def sync(self):
+        """Pull revocations made since the last sync, then prune expired ones"""
+        sessions_collection = mongodb.get_collection(Collections.USER_SESSIONS)
+        now = datetime.utcnow()
+        since = (self.synced_until or now) - self.sync_overlap
+
+        sessions = await sessions_collection.find(
+            {"revoked_at": {"$gte": since}}, {"expires_at": 1}
+        ).to_list(None)
+        for session in sessions:
+            self.revoked[session["_id"]] = session["expires_at"]
+
+        self.revoked = {
+            sid: expires_at
+            for sid, expires_at in self.revoked.items()
+            if expires_at > now
+        }
+        self.synced_until = now
+        self.last_sync = time.monotonic()
+        self.syncs += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing revoked sessions: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "revoked": len(self.revoked),
+            "syncs": self.syncs,
+            "sync_interval": self.sync_interval,
+            "seconds_since_sync": round(time.monotonic() - self.last_sync, 3),
+        }
+
+
+# Create session store instance
+session_store = SessionStore()
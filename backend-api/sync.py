@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, AsyncIterator
+
+from decouple import config
+from pymongo import ReturnDocument
+
+from database import mongodb, Collections
+
+# A missing sequence number younger than this is assumed to still be in
+# flight (allocated but not yet inserted), so sync stops in front of it
+SYNC_GAP_GRACE = timedelta(seconds=config("SYNC_GAP_GRACE", 5.0, cast=float))
+SYNC_BATCH_SIZE = config("SYNC_BATCH_SIZE", 200, cast=int)
+
+
+async def next_seq(chat_id, count: int = 1) -> int:
+    """Atomically reserve `count` sequence numbers for a chat, returning the
+    last one reserved"""
+    chats_collection = mongodb.get_collection(Collections.CHATS)
+    chat = await chats_collection.find_one_and_update(
+        {"_id": chat_id},
+        {"$inc": {"seq": count}},
+        projection={"seq": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return chat["seq"]
+
+
+async def iter_chat_messages(
+    chat_id: str, since: int, limit: int = 0
+) -> AsyncIterator[Dict[str, Any]]:
+    """Messages of a chat with seq > since, in order, at most `limit` of
+    them (0 for no limit).
+
+    Stops early at a recent gap in the sequence so the caller's sync state
+    never moves past a message that is still being written.
+    """
+    messages_collection = mongodb.get_collection(Collections.MESSAGES)
+    cursor = (
+        messages_collection.find(
+            {"chat_id": chat_id, "seq": {"$gt": since}}, {"outbox": 0}
+        )
+        .sort("seq", 1)
+        .limit(limit)
+        .batch_size(min(limit, SYNC_BATCH_SIZE) if limit else SYNC_BATCH_SIZE)
+    )
+
+    expected = since + 1
+    try:
+        async for message in cursor:
+            # Judged by the _id timestamp rather than created_at, which bulk
+            # imports may set far in the past
+            if (
+                message["seq"] != expected
+                and datetime.now(timezone.utc) - message["_id"].generation_time
+                < SYNC_GAP_GRACE
+            ):
+                break
+            yield message
+            expected = message["seq"] + 1
+    finally:
+        await cursor.close()
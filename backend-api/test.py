@@ -34,6 +34,7 @@ async def test_centrifugo():
     else:
         print("✗ Failed to publish message")
 
+    await centrifugo_client.close()
     print("Test completed")
 
 
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+from decouple import config
+
+from centrifugo_client import centrifugo_client
+
+logger = logging.getLogger(__name__)
+
+
+class TypingState:
+    __slots__ = ("username", "expires_at", "last_published")
+
+    def __init__(self, username: str, expires_at: float, last_published: float):
+        self.username = username
+        self.expires_at = expires_at
+        self.last_published = last_published
+
+
+class TypingStateEngine:
+    """Tracks who is typing where and only publishes meaningful changes.
+
+    A start is published when a user begins typing, a refresh at most every
+    TYPING_REFRESH_INTERVAL seconds while they keep typing, and a stop when
+    they stop or their state expires after TYPING_TIMEOUT seconds of silence.
+    """
+
+    def __init__(self):
+        self.timeout = config("TYPING_TIMEOUT", 5.0, cast=float)
+        self.refresh_interval = config("TYPING_REFRESH_INTERVAL", 3.0, cast=float)
+        self.sweep_interval = config("TYPING_SWEEP_INTERVAL", 1.0, cast=float)
+
+        # (chat_id, user_id) -> TypingState
+        self.states: Dict[Tuple[str, str], TypingState] = {}
+        self.task: Optional[asyncio.Task] = None
+
+        self.received = 0
+        self.published = 0
+        self.expired = 0
+
+    def start(self):
+        if self.task and not self.task.done():
+            return
+        self.task = asyncio.create_task(self._sweep())
+
+    async def stop(self):
+        if not self.task:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def update(
+        self, chat_id: str, user_id: str, username: str, is_typing: bool
+    ) -> bool:
+        """Record a typing update, returning True if it was published"""
+        self.received += 1
+        now = time.monotonic()
+        key = (chat_id, user_id)
+        state = self.states.get(key)
+
+        if not is_typing:
+            if state is None:
+                return False
+            del self.states[key]
+            await self._publish(chat_id, user_id, username, False)
+            return True
+
+        if state is None:
+            self.states[key] = TypingState(username, now + self.timeout, now)
+            await self._publish(chat_id, user_id, username, True)
+            return True
+
+        state.expires_at = now + self.timeout
+        if now - state.last_published >= self.refresh_interval:
+            state.last_published = now
+            await self._publish(chat_id, user_id, username, True)
+            return True
+
+        return False
+
+    async def _publish(
+        self, chat_id: str, user_id: str, username: str, is_typing: bool
+    ):
+        self.published += 1
+        # Fire and forget: the batcher resolves the future once it is sent
+        await centrifugo_client.batcher.submit(
+            f"chat-{chat_id}",
+            {
+                "type": "typing_indicator",
+                "user_id": user_id,
+                "username": username,
+                "is_typing": is_typing,
+            },
+        )
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            now = time.monotonic()
+            expired = [
+                key for key, state in self.states.items() if state.expires_at <= now
+            ]
+            for key in expired:
+                state = self.states.pop(key, None)
+                if state is None:
+                    continue
+                self.expired += 1
+                chat_id, user_id = key
+                try:
+                    await self._publish(chat_id, user_id, state.username, False)
+                except Exception as e:
+                    logger.error(f"Error publishing typing expiry for {key}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self.states),
+            "received": self.received,
+            "published": self.published,
+            "suppressed": self.received - self.published + self.expired,
+            "expired": self.expired,
+            "timeout": self.timeout,
+            "refresh_interval": self.refresh_interval,
+        }
+
+
+# Create typing state engine instance
+typing_state = TypingStateEngine()
@@ -0,0 +1,102 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+from bson import ObjectId
+from decouple import config
+
+from database import mongodb, Collections
+from utils import TTLCache, serialize_doc
+
+
+def search_keys(username: str, email: str) -> Dict[str, str]:
+    """Lowercase keys stored on every user so prefix search can use an index"""
+    return {"username_lower": username.lower(), "email_lower": email.lower()}
+
+
+class UserSearch:
+    """Prefix search over users' lowercase username and email.
+
+    Queries are anchored, escaped regexes on the username_lower/email_lower
+    indexes, ordered by (username_lower, _id) and paged with the last user's
+    ID as the cursor. First pages for short prefixes, which every picker
+    types first and which match the most users, are cached briefly.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache(
+            max_size=config("USER_SEARCH_CACHE_SIZE", 1000, cast=int),
+            ttl=config("USER_SEARCH_CACHE_TTL", 30, cast=float),
+        )
+        self.cached_prefix_length = config("USER_SEARCH_CACHE_PREFIX", 2, cast=int)
+
+    async def search(
+        self, prefix: Optional[str], limit: int, after: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Serialized users matching prefix and the next cursor; raises
+        ValueError for a malformed cursor"""
+        prefix = (prefix or "").strip().lower()
+        cacheable = not after and len(prefix) <= self.cached_prefix_length
+        if cacheable:
+            cached = self.cache.get((prefix, limit))
+            if cached is not None:
+                return cached
+
+        users_collection = mongodb.get_collection(Collections.USERS)
+        clauses = []
+        if prefix:
+            pattern = "^" + re.escape(prefix)
+            clauses.append(
+                {
+                    "$or": [
+                        {"username_lower": {"$regex": pattern}},
+                        {"email_lower": {"$regex": pattern}},
+                    ]
+                }
+            )
+        if after:
+            last = None
+            if ObjectId.is_valid(after):
+                last = await users_collection.find_one(
+                    {"_id": ObjectId(after)}, {"username_lower": 1}
+                )
+            if last is None:
+                raise ValueError("Invalid cursor")
+            clauses.append(
+                {
+                    "$or": [
+                        {"username_lower": {"$gt": last["username_lower"]}},
+                        {
+                            "username_lower": last["username_lower"],
+                            "_id": {"$gt": last["_id"]},
+                        },
+                    ]
+                }
+            )
+        query = {"$and": clauses} if clauses else {}
+
+        users = (
+            await users_collection.find(query, {"password": 0})
+            .sort([("username_lower", 1), ("_id", 1)])
+            .limit(limit + 1)
+            .to_list(limit + 1)
+        )
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = str(users[-1]["_id"])
+
+        result = ([serialize_doc(user) for user in users], next_cursor)
+        if cacheable:
+            self.cache.set((prefix, limit), result)
+        return result
+
+    def invalidate(self):
+        """Drop cached pages; call when users are added or renamed"""
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+# Create user search instance
+user_search = UserSearch()
@@ -0,0 +1,134 @@
+import base64
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Optional, Tuple, Union
+
+from bson import ObjectId
+
+
+def serialize_doc(doc):
+    """Convert MongoDB document to JSON-serializable format (including _id and datetime)."""
+    if not doc:
+        return doc
+
+    # Convert _id to string and rename it to "id"
+    if "_id" in doc:
+        doc["id"] = str(doc["_id"])
+        del doc["_id"]
+
+    # Recursively convert datetime objects
+    for key, value in doc.items():
+        if isinstance(value, datetime):
+            doc[key] = value.isoformat()
+        elif isinstance(value, dict):
+            doc[key] = serialize_doc(value)
+        elif isinstance(value, list):
+            doc[key] = [
+                (
+                    serialize_doc(v)
+                    if isinstance(v, dict)
+                    else (v.isoformat() if isinstance(v, datetime) else v)
+                )
+                for v in value
+            ]
+
+    return doc
+
+
+def encode_cursor(sort_value: Union[datetime, float], doc_id: ObjectId) -> str:
+    """Opaque keyset cursor for a (datetime or score, _id) sort position"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    else:
+        sort_value = repr(float(sort_value))
+    raw = f"{sort_value}|{doc_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, kind: Optional[type] = None
+) -> Tuple[Union[datetime, float], ObjectId]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors and,
+    if kind (datetime or float) is given, for cursors of the other kind"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, doc_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        try:
+            sort_value = datetime.fromisoformat(sort_value)
+        except ValueError:
+            sort_value = float(sort_value)
+        doc_id = ObjectId(doc_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if kind is not None and not isinstance(sort_value, kind):
+        raise ValueError("Invalid cursor")
+    return sort_value, doc_id
+
+
+def keyset_filter(
+    field: str, cursor: str, direction: int, kind: Optional[type] = None
+) -> dict:
+    """Query matching documents strictly past the cursor in (field, _id) order.
+
+    direction -1 walks towards older values, 1 towards newer ones.
+    """
+    sort_value, doc_id = decode_cursor(cursor, kind)
+    op = "$lt" if direction < 0 else "$gt"
+    return {
+        "$or": [
+            {field: {op: sort_value}},
+            {field: sort_value, "_id": {op: doc_id}},
+        ]
+    }
+
+
+def direct_chat_key(participants: Iterable[str]) -> str:
+    """Canonical key for a direct chat: its sorted, de-duplicated participants"""
+    return "|".join(sorted(set(participants)))
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }